@@ -30,8 +30,14 @@ class MZMSettings(settings.Group):
         Set it to true to have the operating system default program open the rom
         Alternatively, set it to a path to a program to open the .gba file with
         """
+    class CompressionCache(settings.Bool):
+        """
+        Set this to true to keep the tilemaps compressed while patching in the user cache directory,
+        so that later patches don't compress them again
+        """
     rom_file: RomFile = RomFile(RomFile.copy_to)
     rom_start: typing.Union[RomStart, bool] = True
+    compression_cache: typing.Union[CompressionCache, bool] = False
 
 class MZMWeb(WebWorld):
     theme = "ice"
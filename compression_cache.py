@@ -0,0 +1,136 @@
+"""
+Memoization of lz10 and rle compression. The tilemaps edited while patching are the same for every
+seed, so their compressed data is cached in memory and, if it's turned on in the host settings, on disk
+in the user cache directory.
+"""
+from array import array
+from collections import OrderedDict
+import hashlib
+import os
+from types import ModuleType
+from typing import Callable, Iterable, Optional, Tuple, Union
+
+from . import lz10, rle
+
+ByteString = Union[bytes, bytearray, memoryview]
+
+
+def source_digest(*modules: ModuleType) -> str:
+    """Digest of the source of `modules`, which also works when they're loaded from an apworld."""
+    hasher = hashlib.blake2b(digest_size=8)
+    for module in modules:
+        hasher.update(module.__loader__.get_data(module.__file__))
+    return hasher.hexdigest()
+
+
+# Entries made by other versions of the codecs are never looked up
+CACHE_VERSION = source_digest(lz10, rle)
+
+
+def default_directory() -> Optional[str]:
+    """Return the directory of the disk store if it's turned on in the host settings, or None."""
+    try:
+        import Utils
+    except ImportError:
+        return None
+    if not Utils.get_options()["mzm_options"]["compression_cache"]:
+        return None
+    return Utils.cache_path("mzm", "compression")
+
+
+class CompressionCache:
+    maxsize: int
+    directory: Optional[str]
+    entries: "OrderedDict[str, bytes]"
+
+    def __init__(self, maxsize: int = 128, directory: Optional[str] = None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def key(codec: str, settings: Tuple, inputs: Iterable[ByteString]) -> str:
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(f"{codec}/{CACHE_VERSION}/{settings!r}".encode())
+        for data in inputs:
+            hasher.update(len(data).to_bytes(4, "little"))
+            hasher.update(data)
+        return hasher.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+            return value
+        if self.directory is None:
+            return None
+
+        try:
+            with open(self._path(key), "rb") as stream:
+                stored = stream.read()
+        except OSError:
+            return None
+        # Each file starts with a checksum of its contents, so that partial writes are ignored
+        checksum, value = stored[:16], stored[16:]
+        if hashlib.blake2b(value, digest_size=16).digest() != checksum:
+            return None
+        self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: bytes):
+        self._remember(key, value)
+        if self.directory is None:
+            return
+
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, "wb") as stream:
+                stream.write(hashlib.blake2b(value, digest_size=16).digest())
+                stream.write(value)
+            os.replace(temp_path, path)
+        except OSError:
+            # The disk cache is only an optimization
+            pass
+
+    def _remember(self, key: str, value: bytes):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def memoize(self, codec: str, settings: Tuple, inputs: Iterable[ByteString], compute: Callable[[], ByteString]) -> bytes:
+        key = self.key(codec, settings, inputs)
+        value = self.get(key)
+        if value is None:
+            value = bytes(compute())
+            self.put(key, value)
+        return value
+
+
+# Only kept in memory until the patch steps turn on the disk store
+cache = CompressionCache()
+
+
+def lz10_tokenize(data: ByteString, level: int = lz10.GREEDY) -> lz10.Tokens:
+    """Cached lz10.tokenize. The parse is what's slow, so it's cached rather than the encoded data."""
+    tokens = array("I")
+    tokens.frombytes(cache.memoize("lz10-tokens", (level,), (data,), lambda: lz10.tokenize(data, level).tobytes()))
+    return tokens
+
+
+def lz10_compress_incremental(data: ByteString, original: ByteString, start: int) -> bytes:
+    """Cached lz10.compress_incremental, reusing the tokens of the LZSS-compressed bytes `original`."""
+    return cache.memoize("lz10-incremental", (start,), (data, original),
+                         lambda: lz10.compress_incremental(data, lz10.read_tokens(original), start))
+
+
+def rle_compress(data: ByteString, encoding: Optional[rle.Encoding] = None) -> bytes:
+    """Cached rle.compress. If the data's encoding was already found, it's used instead of finding it again."""
+    if encoding is None:
+        return cache.memoize("rle", (), (data,), lambda: rle.compress(data))
+    return cache.memoize("rle", (), (data,), encoding.encode)
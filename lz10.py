@@ -1,7 +1,14 @@
-from collections import defaultdict
+from array import array
+from collections import defaultdict, deque
+import itertools
 from operator import itemgetter
 import struct
-from typing import Union
+from typing import Iterator, Tuple, Union
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 ByteString = Union[bytes, bytearray, memoryview]
 
@@ -15,50 +22,207 @@ https://github.com/magical/nlzss
 
 def decompress(data: ByteString):
     """Decompress LZSS-compressed bytes. Returns a bytearray containing the decompressed data."""
+    return decompress_with_footprint(data)[0]
+
+
+def decompress_with_footprint(data: ByteString) -> Tuple[bytearray, int]:
+    """
+    Decompress LZSS-compressed bytes. Returns a bytearray containing the decompressed data and
+    the number of compressed bytes read, including the header.
+    """
+    decompressed = bytearray(decompressed_size(data))
+    consumed = decompress_into(data, decompressed)
+    return decompressed, consumed
+
+
+def decompressed_size(data: ByteString) -> int:
+    """Read the decompressed size from the header of LZSS-compressed bytes."""
     header = data[:4]
-    if header[0] == 0x10:
-        decompress_raw = decompress_raw_lzss10
-    else:
+    if header[0] != 0x10:
         raise DecompressionError("not as lzss-compressed file")
+    return int.from_bytes(header[1:], "little")
+
+
+def decompress_into(data: ByteString, dst, offset: int = 0) -> int:
+    """
+    Decompress LZSS-compressed bytes into the writable buffer `dst`, starting at `offset`. Returns
+    the number of compressed bytes read, including the header.
+    """
+    size = decompressed_size(data)
+    with memoryview(dst) as view, view[offset:offset + size] as out:
+        if len(out) != size:
+            raise ValueError(f"destination is too small (size: {len(view) - offset}, needed: {size})")
+        for _, consumed in _decode_lzss10(data[4:], out):
+            pass
+    return 4 + consumed
 
-    decompressed_size = int.from_bytes(header[1:], "little")
 
-    data = data[4:]
-    return decompress_raw(data, decompressed_size)
+def iter_decompress(data: ByteString, chunk_size: int = 0x400) -> Iterator[memoryview]:
+    """
+    Decompress LZSS-compressed bytes, generating read-only views of the decompressed data in chunks
+    of at least `chunk_size` bytes as soon as they are decoded.
+    """
+    decompressed = bytearray(decompressed_size(data))
+    with memoryview(decompressed) as view:
+        out = view.toreadonly()
+        written = 0
+        for pos, _ in _decode_lzss10(data[4:], view, chunk_size=chunk_size):
+            if pos > written:
+                yield out[written:pos]
+                written = pos
 
 
-def compress(data: bytearray):
-    byteOut = bytearray()
-    # header
-    byteOut.extend(struct.pack("<L", (len(data) << 8) + 0x10))
+# Compression levels
+GREEDY = 0  # Take the longest match at each position
+OPTIMAL = 1  # Minimize the total encoded size; slower
+
+
+# Tokens are stored in an array of ints. A literal is its byte value; a match is MATCH combined
+# with the 16-bit value it's encoded as: the count minus 3 in the top 4 bits, then the displacement
+# minus 1.
+MATCH = 0x10000
+Tokens = array
+
+
+def make_match(count: int, disp: int) -> int:
+    """Make a match token that copies `count` bytes from `disp` bytes back."""
+    assert 3 <= count <= 18 and 1 <= disp <= 4096
+    return MATCH | (count - 3) << 12 | (disp - 1)
+
+
+def is_match(token: int) -> bool:
+    return bool(token & MATCH)
+
+
+def token_length(token: int) -> int:
+    """Return the number of decompressed bytes a token stands for."""
+    if token & MATCH:
+        return ((token >> 12) & 0xF) + 3
+    return 1
+
+
+def _to_token(t) -> int:
+    if type(t) == tuple:
+        count, disp = t
+        return make_match(count, -disp)
+    return t
+
+
+def tokenize(data: ByteString, level: int = GREEDY) -> Tokens:
+    """Parse data into an array of tokens at the given compression level."""
+    if level == GREEDY:
+        token_stream = _compress(data)
+    elif level == OPTIMAL:
+        token_stream = _compress_optimal(data)
+    else:
+        raise ValueError(f"Invalid compression level: {level}")
+    return array("I", map(_to_token, token_stream))
+
+
+def encoded_size(tokens: Tokens, padding: int = 4) -> int:
+    """Return the size of encode_tokens(tokens, padding) without building the compressed data."""
+    matches = sum(1 for t in tokens if t & MATCH)
+    # header, flag bytes, then one byte per literal and two per match
+    length = 4 + (len(tokens) + 7) // 8 + len(tokens) + matches
+    return length + (-length % padding)
+
+
+def encode_tokens(tokens: Tokens, padding: int = 4) -> bytearray:
+    """Encode tokens as LZSS-compressed bytes, padded with 0xFF to a multiple of `padding` bytes."""
+    byteOut = bytearray(4)
+    decompressed_size = 0
 
     # body
-    length = 0
-    for tokens in chunkit(_compress(data), 8):
-        flags = [type(t) == tuple for t in tokens]
-        byteOut.extend(struct.pack(">B", packflags(flags)))
-
-        for t in tokens:
-            if type(t) == tuple:
-                count, disp = t
-                count -= 3
-                disp = (-disp) - 1
-                assert 0 <= disp < 4096
-                sh = (count << 12) | disp
-                byteOut.extend(struct.pack(">H", sh))
+    for i in range(0, len(tokens), 8):
+        flag_index = len(byteOut)
+        byteOut.append(0)
+        flags = 0
+        for bit, t in enumerate(tokens[i:i + 8]):
+            if t & MATCH:
+                flags |= 0x80 >> bit
+                byteOut.append((t >> 8) & 0xFF)
+                byteOut.append(t & 0xFF)
+                decompressed_size += ((t >> 12) & 0xF) + 3
             else:
-                byteOut.extend(struct.pack(">B", t))
+                byteOut.append(t)
+                decompressed_size += 1
+        byteOut[flag_index] = flags
 
-        length += 1
-        length += sum(2 if f else 1 for f in flags)
+    # header
+    byteOut[0:4] = struct.pack("<L", (decompressed_size << 8) + 0x10)
 
     # padding
-    padding = 4 - (length % 4 or 4)
-    if padding:
-        byteOut.extend(b'\xff' * padding)
+    byteOut.extend(b'\xff' * (-len(byteOut) % padding))
     return byteOut
 
 
+def compressed_size(data: ByteString, level: int = GREEDY) -> int:
+    """Return the size of compress(data, level) without building the compressed data."""
+    return encoded_size(tokenize(data, level))
+
+
+def compress(data: bytearray, level: int = GREEDY):
+    return encode_tokens(tokenize(data, level))
+
+
+def compress_incremental(data: ByteString, tokens: Tokens, start: int):
+    """
+    Compress `data` after an edit, reusing the tokens of the data before the edit. `tokens` is the
+    token stream of the original data, for example from read_tokens, and `start` is the offset of
+    the first changed byte. Tokens that can't have been affected by the edit are kept as they are,
+    and the rest of the data is compressed greedily.
+
+    If `tokens` is the greedy parse of the original data, the result is identical to compress(data).
+    """
+    end = len(data)
+    pos = 0
+    kept = 0
+    for t in tokens:
+        length = token_length(t)
+        # The greedy search at a position looks ahead up to match_max bytes, or to the end of the data
+        if min(pos + SlidingWindow.match_max, end) > start or pos + length > end:
+            break
+        kept += 1
+        pos += length
+    new_tokens = tokens[:kept]
+    new_tokens.extend(map(_to_token, _compress(data, start=pos)))
+    return encode_tokens(new_tokens)
+
+
+def read_tokens(data: ByteString) -> Tokens:
+    """Read the tokens back out of LZSS-compressed bytes."""
+    header = data[:4]
+    if header[0] != 0x10:
+        raise DecompressionError("not as lzss-compressed file")
+    decompressed_size = int.from_bytes(header[1:], "little")
+
+    tokens = array("I")
+    pos = 0
+    src = 4
+    try:
+        while pos < decompressed_size:
+            flags = data[src]
+            src += 1
+            for mask in (0x80, 0x40, 0x20, 0x10, 0x08, 0x04, 0x02, 0x01):
+                if not flags & mask:
+                    tokens.append(data[src])
+                    src += 1
+                    pos += 1
+                else:
+                    sh = data[src] << 8 | data[src + 1]
+                    src += 2
+                    tokens.append(MATCH | sh)
+                    pos += (sh >> 0xc) + 3
+                if decompressed_size <= pos:
+                    break
+    except IndexError:
+        raise DecompressionError("compressed data ended early") from None
+
+    if pos != decompressed_size:
+        raise DecompressionError("decompressed size does not match the expected size")
+    return tokens
+
+
 class SlidingWindow:
     # The size of the sliding window
     size = 4096
@@ -151,13 +315,148 @@ class SlidingWindow:
         return matchlen
 
 
-def _compress(input, windowclass=SlidingWindow):
+class HashChainWindow(SlidingWindow):
+    """Sliding window that indexes positions by their first `match_min` bytes.
+
+    Each 3-byte prefix maps to a deque of positions in ascending order, so evicting the oldest
+    position is O(1) and only candidates that can reach `match_min` are compared. Candidates are
+    examined in the same order as `SlidingWindow.search`, so with an unbounded chain depth the
+    chosen matches, and therefore the compressed output, are identical.
+    """
+
+    # The maximum number of candidates examined per search, newest first. None examines every
+    # candidate in the window, oldest first.
+    chain_depth = None
+
+    # Chains at least this long are compared against the lookahead in one vectorized operation
+    # when NumPy is installed. Below this, the per-call overhead of NumPy outweighs the Python loop
+    # and its one-byte rejection test. None disables NumPy.
+    vectorize_min = 256
+
+    def __init__(self, buf):
+        self.data = bytes(buf)
+        self.chains = defaultdict(deque)
+        self.index = 0
+        # Positions below this have been added to their chain
+        self.stop = 0
+
+        self.rows = None
+        if numpy is not None and self.vectorize_min is not None:
+            # Row i is a view of the match_max bytes starting at position i
+            padded = numpy.frombuffer(self.data + bytes(self.match_max), dtype=numpy.uint8)
+            self.rows = numpy.lib.stride_tricks.sliding_window_view(padded, self.match_max)
+
+    def _key(self, pos):
+        data = self.data
+        return data[pos] << 16 | data[pos + 1] << 8 | data[pos + 2]
+
+    def next(self):
+        self.advance(1)
+
+    def advance(self, n=1):
+        """Advance the window by n bytes"""
+        self.index += n
+        # Positions closer than disp_min can't be referenced, so they're added lazily
+        stop = min(self.index - self.disp_min + 1, len(self.data) - self.match_min + 1)
+        chains = self.chains
+        key = self._key
+        for pos in range(self.stop, stop):
+            chains[key(pos)].append(pos)
+        self.stop = max(self.stop, stop)
+
+    def search(self):
+        data = self.data
+        index = self.index
+        lookahead = min(len(data) - index, self.match_max)
+        if lookahead < self.match_min:
+            return None
+
+        chain = self.chains.get(self._key(index))
+        if not chain:
+            return None
+        start = index - self.size
+        while chain and chain[0] < start:
+            chain.popleft()
+
+        if self.rows is not None and len(chain) >= self.vectorize_min:
+            return self._search_vectorized(chain, index, lookahead)
+
+        target = data[index:index + lookahead]
+        best_length = 0
+        best_pos = None
+        if self.chain_depth is None:
+            # Oldest first; the first candidate of a given length wins ties
+            for pos in chain:
+                # A candidate can only be longer if it matches the byte the best one missed
+                if data[pos + best_length] != target[best_length]:
+                    continue
+                length = self.match(pos, index, target, lookahead)
+                if length > best_length:
+                    best_length = length
+                    best_pos = pos
+                    if length >= lookahead:
+                        break
+        else:
+            # Newest first; the nearest candidate of a given length wins ties
+            for pos in itertools.islice(reversed(chain), self.chain_depth):
+                if data[pos + best_length] != target[best_length]:
+                    continue
+                length = self.match(pos, index, target, lookahead)
+                if length > best_length:
+                    best_length = length
+                    best_pos = pos
+                    if length >= lookahead:
+                        break
+
+        if best_pos is None:
+            return None
+        return best_length, best_pos - index
+
+    def _search_vectorized(self, chain, index, lookahead):
+        if self.chain_depth is None:
+            positions = numpy.fromiter(chain, dtype=numpy.intp, count=len(chain))
+        else:
+            count = min(len(chain), self.chain_depth)
+            positions = numpy.fromiter(itertools.islice(reversed(chain), count), dtype=numpy.intp, count=count)[::-1]
+
+        # The match length of each candidate is the index of its first mismatch
+        mismatches = self.rows[positions, :lookahead] != self.rows[index, :lookahead]
+        lengths = numpy.where(mismatches.any(axis=1), mismatches.argmax(axis=1), lookahead)
+
+        # Break ties the same way as the loops in search
+        if self.chain_depth is None:
+            best = int(lengths.argmax())
+        else:
+            best = len(lengths) - 1 - int(lengths[::-1].argmax())
+        return int(lengths[best]), int(positions[best]) - index
+
+    def match(self, start, bufstart, target, lookahead):
+        data = self.data
+        if data[start:start + lookahead] == target:
+            return lookahead
+        # The chain key guarantees the first match_min bytes are equal
+        matchlen = self.match_min
+        while data[start + matchlen] == data[bufstart + matchlen]:
+            matchlen += 1
+        return matchlen
+
+
+class NearestMatchWindow(HashChainWindow):
+    """Finds the same match lengths as HashChainWindow but prefers the nearest candidate, which
+    lets the search stop at the first match of the maximum length."""
+
+    chain_depth = SlidingWindow.size
+
+
+def _compress(input, windowclass=HashChainWindow, start=0):
     """Generates a stream of tokens. Either a byte (int) or a tuple of (count,
-    displacement)."""
+    displacement). If `start` is given, generates only the tokens from that offset on."""
 
     window = windowclass(input)
+    if start:
+        window.advance(start)
 
-    i = 0
+    i = start
     while True:
         if len(input) <= i:
             break
@@ -172,89 +471,120 @@ def _compress(input, windowclass=SlidingWindow):
             i += 1
 
 
-def packflags(flags):
-    n = 0
-    for i in range(8):
-        n <<= 1
-        try:
-            if flags[i]:
-                n |= 1
-        except IndexError:
-            pass
-    return n
-
+def _compress_optimal(input, windowclass=NearestMatchWindow):
+    """Generates the same kind of token stream as _compress, but chooses the parse with the
+    smallest encoded size instead of the longest match at each position."""
 
-def chunkit(it, n):
-    buf = []
-    for x in it:
-        buf.append(x)
-        if n <= len(buf):
-            yield buf
-            buf = []
-    if buf:
-        yield buf
+    # Encoded cost of each token in bits, including its flag bit
+    literal_cost = 1 + 8
+    match_cost = 1 + 16
 
+    # Find the longest match starting at every position
+    window = windowclass(input)
+    matches = []
+    for _ in range(len(input)):
+        matches.append(window.search())
+        window.next()
+
+    # Shortest path from each position to the end
+    cost = [0] * (len(input) + 1)
+    choice = [1] * len(input)
+    for i in range(len(input) - 1, -1, -1):
+        best = cost[i + 1] + literal_cost
+        length = 1
+        match = matches[i]
+        if match:
+            for count in range(match[0], window.match_min - 1, -1):
+                count_cost = cost[i + count] + match_cost
+                if count_cost < best:
+                    best = count_cost
+                    length = count
+        cost[i] = best
+        choice[i] = length
 
-def bits(byte):
-    return ((byte >> 7) & 1,
-            (byte >> 6) & 1,
-            (byte >> 5) & 1,
-            (byte >> 4) & 1,
-            (byte >> 3) & 1,
-            (byte >> 2) & 1,
-            (byte >> 1) & 1,
-            byte & 1)
+    i = 0
+    while i < len(input):
+        length = choice[i]
+        if length == 1:
+            yield input[i]
+        else:
+            # Any prefix of the longest match is a match at the same displacement
+            yield length, matches[i][1]
+        i += length
 
 
 def decompress_raw_lzss10(indata, decompressed_size, _overlay=False):
     """Decompress LZSS-compressed bytes. Returns a bytearray."""
-    data = bytearray()
+    data = bytearray(decompressed_size)
+    with memoryview(data) as out:
+        for _ in _decode_lzss10(indata, out, _overlay):
+            pass
+    return data
+
 
-    it = iter(indata)
+def _decode_lzss10(indata, out: memoryview, _overlay=False, chunk_size=None):
+    """
+    Decode LZSS-compressed bytes into `out`, which must be exactly the decompressed size. Generates
+    (bytes written, bytes read) after at least every `chunk_size` bytes written, and once at the end.
+    """
+    decompressed_size = len(out)
+    next_chunk = decompressed_size if chunk_size is None else chunk_size
 
     if _overlay:
         disp_extra = 3
     else:
         disp_extra = 1
 
-    def writebyte(b):
-        data.append(b)
-
-    def readbyte():
-        return next(it)
-
-    def readshort():
-        # big-endian
-        a = next(it)
-        b = next(it)
-        return (a << 8) | b
-
-    def copybyte():
-        data.append(next(it))
-
-    while len(data) < decompressed_size:
-        b = readbyte()
-        flags = bits(b)
-        for flag in flags:
-            if flag == 0:
-                copybyte()
-            elif flag == 1:
-                sh = readshort()
-                count = (sh >> 0xc) + 3
-                disp = (sh & 0xfff) + disp_extra
-
-                for _ in range(count):
-                    writebyte(data[-disp])
-            else:
-                raise ValueError(flag)
-
-            if decompressed_size <= len(data):
-                break
-
-    if len(data) != decompressed_size:
-        raise DecompressionError("decompressed size does not match the expected size")
-
-    return data
+    pos = 0
+    src = 0
+    try:
+        while pos < decompressed_size:
+            if pos >= next_chunk:
+                yield pos, src
+                next_chunk = pos + chunk_size
+
+            flags = indata[src]
+            src += 1
+            if flags == 0 and pos + 8 <= decompressed_size:
+                # Eight literals in a row
+                if src + 8 > len(indata):
+                    raise DecompressionError("compressed data ended early")
+                out[pos:pos + 8] = indata[src:src + 8]
+                src += 8
+                pos += 8
+                continue
+            for mask in (0x80, 0x40, 0x20, 0x10, 0x08, 0x04, 0x02, 0x01):
+                if not flags & mask:
+                    out[pos] = indata[src]
+                    src += 1
+                    pos += 1
+                else:
+                    # big-endian
+                    sh = indata[src] << 8 | indata[src + 1]
+                    src += 2
+                    count = (sh >> 0xc) + 3
+                    disp = (sh & 0xfff) + disp_extra
+
+                    start = pos - disp
+                    end = pos + count
+                    if start < 0 or end > decompressed_size:
+                        raise DecompressionError("back-reference out of bounds")
+                    if disp >= count:
+                        out[pos:end] = out[start:start + count]
+                        pos = end
+                    else:
+                        # Overlapping run: every copy doubles the length that can be copied next
+                        while pos < end:
+                            n = min(pos - start, end - pos)
+                            out[pos:pos + n] = out[start:start + n]
+                            pos += n
+
+                if decompressed_size <= pos:
+                    break
+    except IndexError:
+        raise DecompressionError("compressed data ended early") from None
+
+    yield pos, src
 
 
 class DecompressionError(ValueError):
@@ -0,0 +1,217 @@
+"""
+Precomputed results of the background and layout patches. Those patches only depend on the base ROM, so
+their output can be computed once and shipped as byte ranges instead of being recomputed on every patch.
+Deltas built before a change to rom_data, the codecs, or the patch data are ignored until they're rebuilt.
+To rebuild data/patch_deltas.bin, run from the Archipelago directory:
+
+    python -m worlds.mzm.patch_deltas "Metroid - Zero Mission (USA).gba"
+"""
+import argparse
+import hashlib
+import struct
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from . import compression_cache, data, lz10, rle, rom_data
+
+
+MAGIC = b"MZMD"
+FORMAT_VERSION = 2
+
+# Name of the delta set made by apply_always_background_patches
+BACKGROUND = "background"
+# Name of the delta set made by the layout patches that don't need expanded space
+LAYOUT = "layout"
+
+# Differences closer than this are stored as one range
+MERGE_DISTANCE = 8
+
+
+def inputs_digest() -> bytes:
+    """
+    Digest of what the patches are made from besides the ROM: their data, and the code that applies and
+    compresses it. Deltas made by another version of either aren't used.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(data.data_path("layout_patches.json"))
+    hasher.update(repr(rom_data.item_clipdata_and_gfx).encode())
+    hasher.update(compression_cache.source_digest(rom_data, lz10, rle).encode())
+    return hasher.digest()
+
+
+class DeltaSet(NamedTuple):
+    source_digest: bytes  # Digest of the bytes that the ranges replace
+    ranges: List[Tuple[int, bytes]]
+
+    @staticmethod
+    def digest(rom: bytes, ranges: Iterable[Tuple[int, bytes]]) -> bytes:
+        hasher = hashlib.blake2b(digest_size=16)
+        for address, replacement in ranges:
+            hasher.update(rom[address:address + len(replacement)])
+        return hasher.digest()
+
+    @classmethod
+    def difference(cls, before: bytes, after: bytes) -> "DeltaSet":
+        """Find the byte ranges that differ between two ROMs of the same size."""
+        ranges = []
+        start = end = None
+        for block in range(0, len(before), 0x1000):
+            if before[block:block + 0x1000] == after[block:block + 0x1000]:
+                continue
+            for address in range(block, min(block + 0x1000, len(before))):
+                if before[address] == after[address]:
+                    continue
+                if end is not None and address - end < MERGE_DISTANCE:
+                    end = address + 1
+                    continue
+                if start is not None:
+                    ranges.append((start, bytes(after[start:end])))
+                start, end = address, address + 1
+        if start is not None:
+            ranges.append((start, bytes(after[start:end])))
+        return cls(cls.digest(before, ranges), ranges)
+
+    def applies_to(self, rom: bytes) -> bool:
+        return self.digest(rom, self.ranges) == self.source_digest
+
+    def apply(self, rombuffer: bytearray):
+        for address, replacement in self.ranges:
+            rombuffer[address:address + len(replacement)] = replacement
+
+
+class PatchDeltas(NamedTuple):
+    symbols_hash: str
+    inputs_digest: bytes
+    sets: Dict[str, DeltaSet]
+
+    def apply(self, rom: bytes, names: Iterable[str]) -> Optional[bytes]:
+        """Apply the named delta sets. Returns None if any of them is missing or was built from different data."""
+        if self.symbols_hash != data.symbols_hash or self.inputs_digest != inputs_digest():
+            return None
+        delta_sets = []
+        for name in names:
+            delta_set = self.sets.get(name)
+            if delta_set is None or not delta_set.applies_to(rom):
+                return None
+            delta_sets.append(delta_set)
+        rombuffer = bytearray(rom)
+        for delta_set in delta_sets:
+            delta_set.apply(rombuffer)
+        return bytes(rombuffer)
+
+    def to_bytes(self) -> bytes:
+        chunks = [MAGIC, struct.pack("<B16s16sH", FORMAT_VERSION, bytes.fromhex(self.symbols_hash), self.inputs_digest,
+                                     len(self.sets))]
+        for name, delta_set in self.sets.items():
+            encoded_name = name.encode("utf-8")
+            chunks.append(struct.pack("<B", len(encoded_name)))
+            chunks.append(encoded_name)
+            chunks.append(struct.pack("<16sH", delta_set.source_digest, len(delta_set.ranges)))
+            for address, replacement in delta_set.ranges:
+                chunks.append(struct.pack("<IH", address, len(replacement)))
+                chunks.append(replacement)
+        return b"".join(chunks)
+
+    @classmethod
+    def from_bytes(cls, delta_data: bytes) -> "PatchDeltas":
+        if delta_data[:4] != MAGIC:
+            raise ValueError("Not a patch delta file")
+        version, = struct.unpack_from("<B", delta_data, 4)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported patch delta version {version}")
+        _, symbols_hash, digest, set_count = struct.unpack_from("<B16s16sH", delta_data, 4)
+        offset = 4 + struct.calcsize("<B16s16sH")
+        sets = {}
+        for _ in range(set_count):
+            name_length = delta_data[offset]
+            name = delta_data[offset + 1:offset + 1 + name_length].decode("utf-8")
+            offset += 1 + name_length
+            source_digest, range_count = struct.unpack_from("<16sH", delta_data, offset)
+            offset += struct.calcsize("<16sH")
+            ranges = []
+            for _ in range(range_count):
+                address, length = struct.unpack_from("<IH", delta_data, offset)
+                offset += struct.calcsize("<IH")
+                ranges.append((address, delta_data[offset:offset + length]))
+                offset += length
+            sets[name] = DeltaSet(source_digest, ranges)
+        return cls(symbols_hash.hex(), digest, sets)
+
+
+_patch_deltas = None
+
+
+def load_patch_deltas() -> Optional[PatchDeltas]:
+    """Read the shipped deltas, or return None if there aren't any."""
+    global _patch_deltas
+    if _patch_deltas is None:
+        try:
+            _patch_deltas = PatchDeltas.from_bytes(data.data_path("patch_deltas.bin"))
+        except (OSError, ValueError, struct.error):
+            _patch_deltas = PatchDeltas("", b"", {})
+    return _patch_deltas if _patch_deltas.sets else None
+
+
+def apply_patch_deltas(rom: bytes, names: Iterable[str]) -> Optional[bytes]:
+    patch_deltas = load_patch_deltas()
+    if patch_deltas is None:
+        return None
+    return patch_deltas.apply(rom, names)
+
+
+def compute_patch_deltas(rom: bytes) -> PatchDeltas:
+    """Run the patches on a ROM with the base patch applied and record what they change."""
+    # The layout patches run after the background patches, so they're computed from their result
+    background = rom_data.apply_always_background_patches(rom)
+    layout = rom_data.apply_layout_patches(background, set())
+    sets = {
+        BACKGROUND: DeltaSet.difference(rom, background),
+        LAYOUT: DeltaSet.difference(background, layout),
+    }
+    for name in sorted(rom_data.expansion_required_patches):
+        # Each patch is stored on its own, so they can be combined freely as long as they don't overlap
+        sets[name] = DeltaSet.difference(layout, rom_data.apply_layout_patches(background, {name}))
+    patch_deltas = PatchDeltas(data.symbols_hash, inputs_digest(), sets)
+
+    layout_sets = [LAYOUT, *sorted(rom_data.expansion_required_patches)]
+    ranges = sorted(r for name in layout_sets for r in sets[name].ranges)
+    for (address, replacement), (next_address, _) in zip(ranges, ranges[1:]):
+        if address + len(replacement) > next_address:
+            raise ValueError(f"Layout patches overlap at {address:07x}, so they can't be stored separately")
+    expected = rom_data.apply_layout_patches(background, rom_data.expansion_required_patches)
+    if patch_deltas.apply(background, layout_sets) != expected:
+        raise ValueError("Layout patches don't combine independently")
+    return patch_deltas
+
+
+def read_base_patched_rom(path: str) -> bytes:
+    """Read a vanilla Metroid: Zero Mission (U) ROM and apply the base patch to it."""
+    import bsdiff4
+    from .rom import MD5_MZMUS
+
+    with open(path, "rb") as stream:
+        vanilla = stream.read()
+    if hashlib.md5(vanilla).hexdigest() != MD5_MZMUS:
+        raise ValueError("That isn't a Metroid: Zero Mission (U) ROM")
+    return bsdiff4.patch(vanilla, data.data_path("basepatch.bsdiff"))
+
+
+def main():
+    import os
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("rom", help="Path to a vanilla Metroid: Zero Mission (U) ROM")
+    args = parser.parse_args()
+
+    rom = read_base_patched_rom(args.rom)
+    for area, room, layer in rom_data.check_size_limits(rom):
+        print(f"The size limit of {area.name.title()} {room} {layer} is the default, so it can be removed")
+    patch_deltas = compute_patch_deltas(rom)
+    path = os.path.join(os.path.dirname(__file__), "data", "patch_deltas.bin")
+    with open(path, "wb") as stream:
+        stream.write(patch_deltas.to_bytes())
+    for name, delta_set in patch_deltas.sets.items():
+        print(f"{name:28} {len(delta_set.ranges):3} ranges {sum(len(r) for _, r in delta_set.ranges):6} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,90 +1,267 @@
-import itertools
-from typing import List, Tuple, Union
+from bisect import bisect_right
+from operator import itemgetter
+import re
+from typing import List, NamedTuple, Optional, Tuple, Union
 
-from . import iterators
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 ByteString = Union[bytes, bytearray, memoryview]
 
 
 def decompress(data: ByteString):
-    it = iter(data)
-    planes = (bytearray(), bytearray())
-
-    for plane in range(2):
-        read_length = next(it) - 1
-        if read_length not in range(2):
-            raise ValueError(f"read length = {read_length + 1}")
-        if read_length == 0:
-            count = next(it)
-        else:
-            count = next(it) << 8 | next(it)
-
-        while count > 0:
-            flag = 0x80 << (read_length * 8)
-            if count & flag:
-                copied = next(it)
-                planes[plane].extend(copied for _ in range(count & (flag - 1)))
+    return decompress_with_footprint(data)[0]
+
+
+def decompress_with_footprint(data: ByteString) -> Tuple[bytearray, int]:
+    """Decompress RLE-compressed bytes. Returns the decompressed data and the number of compressed bytes read."""
+    data = memoryview(data)
+    pos = 0
+    planes = []
+
+    try:
+        for _ in range(2):
+            read_length = data[pos]
+            pos += 1
+            if read_length not in (1, 2):
+                raise ValueError(f"read length = {read_length}")
+            flag = 0x80 << (8 * (read_length - 1))
+            pieces = []
+
+            while True:
+                if read_length == 1:
+                    count = data[pos]
+                else:
+                    count = data[pos] << 8 | data[pos + 1]
+                pos += read_length
+                if count == 0:
+                    break
+
+                if count & flag:
+                    pieces.append(bytes((data[pos],)) * (count & (flag - 1)))
+                    pos += 1
+                else:
+                    literals = data[pos:pos + count]
+                    if len(literals) < count:
+                        raise IndexError
+                    pieces.append(literals)
+                    pos += count
+            planes.append(b"".join(pieces))
+    except IndexError:
+        raise ValueError("RLE data ends before its terminator") from None
+
+    lo, hi = planes
+    if len(lo) != len(hi):
+        raise ValueError(f"RLE planes have different lengths ({len(lo)} and {len(hi)})")
+    decompressed = bytearray(2 * len(lo))
+    decompressed[0::2] = lo
+    decompressed[1::2] = hi
+    return decompressed, pos
+
+
+class RunIndex:
+    """
+    Random access to RLE-compressed halfword data. Only the run boundaries are read up front;
+    halfwords are decoded when they're requested.
+    """
+    data: memoryview
+    footprint: int
+    length: int
+    planes: List[Tuple[List[int], List[Optional[int]], List[int]]]
+
+    def __init__(self, data: ByteString):
+        self.data = data = memoryview(data)
+        self.planes = []
+        pos = 0
+
+        try:
+            for _ in range(2):
+                read_length = data[pos]
+                pos += 1
+                if read_length not in (1, 2):
+                    raise ValueError(f"read length = {read_length}")
+                flag = 0x80 << (8 * (read_length - 1))
+                # Where each run starts in the plane, its value if it repeats one byte, and where its
+                # bytes start in the compressed data
+                starts, values, offsets = [0], [], []
+
+                while True:
+                    if read_length == 1:
+                        count = data[pos]
+                    else:
+                        count = data[pos] << 8 | data[pos + 1]
+                    pos += read_length
+                    if count == 0:
+                        break
+
+                    if count & flag:
+                        values.append(data[pos])
+                        count &= flag - 1
+                        offsets.append(pos)
+                        pos += 1
+                    else:
+                        if pos + count > len(data):
+                            raise IndexError
+                        values.append(None)
+                        offsets.append(pos)
+                        pos += count
+                    starts.append(starts[-1] + count)
+                self.planes.append((starts, values, offsets))
+        except IndexError:
+            raise ValueError("RLE data ends before its terminator") from None
+
+        lo_length = self.planes[0][0][-1]
+        hi_length = self.planes[1][0][-1]
+        if lo_length != hi_length:
+            raise ValueError(f"RLE planes have different lengths ({lo_length} and {hi_length})")
+        self.length = lo_length
+        self.footprint = pos
+
+    def __len__(self):
+        """The number of halfwords."""
+        return self.length
+
+    def _read_plane(self, plane: int, start: int, stop: int) -> bytes:
+        starts, values, offsets = self.planes[plane]
+        pieces = []
+        run = bisect_right(starts, start) - 1
+        while start < stop:
+            end = min(starts[run + 1], stop)
+            value = values[run]
+            if value is None:
+                offset = offsets[run] + start - starts[run]
+                pieces.append(self.data[offset:offset + end - start])
             else:
-                planes[plane].extend(next(it) for _ in range(count))
+                pieces.append(bytes((value,)) * (end - start))
+            start = end
+            run += 1
+        return b"".join(pieces)
+
+    def read(self, start: int, stop: int) -> bytearray:
+        """Decode the halfwords from index `start` up to `stop`."""
+        start, stop, _ = slice(start, stop).indices(self.length)
+        decompressed = bytearray(2 * max(stop - start, 0))
+        decompressed[0::2] = self._read_plane(0, start, stop)
+        decompressed[1::2] = self._read_plane(1, start, stop)
+        return decompressed
+
+
+# A byte followed by any number of copies of itself
+_run_pattern = re.compile(rb"(.)\1*", re.DOTALL)
+
+
+def _run_lengths(plane: bytes) -> List[Tuple[int, int]]:
+    """Find the runs of the same value in a byte string as (value, length) pairs."""
+    if not plane:
+        return []
+    if numpy is not None:
+        values = numpy.frombuffer(plane, dtype=numpy.uint8)
+        starts = numpy.flatnonzero(values[1:] != values[:-1]) + 1
+        bounds = numpy.concatenate(([0], starts, [len(plane)]))
+        return list(zip(values[bounds[:-1]].tolist(), numpy.diff(bounds).tolist()))
+    return [(plane[match.start()], match.end() - match.start()) for match in _run_pattern.finditer(plane)]
 
-            if read_length == 0:
-                count = next(it)
+
+def _plane_run_lengths(data: ByteString):
+    """Split halfword data into its low and high byte planes, and generate the runs of the same
+    value in each plane as (value, length) pairs."""
+    data = bytes(data)
+    for plane in (data[0::2], data[1::2]):
+        yield _run_lengths(plane)
+
+
+def _encoded_size(run_lengths: List[Tuple[int, int]], read_length: int) -> int:
+    """Count the bytes that compress would write for one plane with the given read length."""
+    min_run_length = 3 + read_length
+    max_run_length = (0x80 << (8 * read_length)) - 1
+    size = 1
+    unique = 0
+
+    for _, run_length in run_lengths:
+        while run_length > 0:
+            if run_length >= min_run_length:
+                if unique > 0:
+                    size += read_length + 1 + unique
+                    unique = 0
+                size += read_length + 1 + 1
             else:
-                count = next(it) << 8 | next(it)
+                if unique + run_length > max_run_length:
+                    size += read_length + 1 + unique
+                    unique = 0
+                unique += run_length
+            run_length -= max_run_length
+    if unique > 0:
+        size += read_length + 1 + unique
+    return size + read_length + 1
 
-    return bytearray(iterators.interleave(*planes))
 
+def _best_read_length(run_lengths: List[Tuple[int, int]]) -> Tuple[int, int]:
+    """Pick the read length that encodes a plane in the fewest bytes. Returns the read length
+    and the encoded size."""
+    return min(((read_length, _encoded_size(run_lengths, read_length)) for read_length in range(2)),
+               key=itemgetter(1))
 
-def compress(data: ByteString):
-    t1, t2 = itertools.tee(iterators.batched(data, 2))
-    lo = (t[0] for t in t1)
-    hi = (t[1] for t in t2)
-    compressed = bytearray()
-
-    for plane in (lo, hi):
-        # Count runs of the same value
-        run_lengths: List[Tuple[int, int]] = []
-        count = 1
-        for prev, curr in iterators.pairwise(plane):
-            if prev == curr:
-                count += 1
+
+class Encoding(NamedTuple):
+    """
+    The runs of each plane of some data, with the read length that encodes each plane in the fewest
+    bytes. It's enough to both measure and build the compressed data, so the runs are only found once.
+    """
+    planes: List[Tuple[List[Tuple[int, int]], int, int]]  # Run lengths, read length, and encoded size
+
+    @property
+    def size(self) -> int:
+        return sum(size for _, _, size in self.planes)
+
+    def encode(self) -> bytes:
+        compressed = bytearray()
+        for run_lengths, read_length, _ in self.planes:
+            _encode_plane(compressed, run_lengths, read_length)
+        return bytes(compressed)
+
+
+def encoding(data: ByteString) -> Encoding:
+    return Encoding([(run_lengths, *_best_read_length(run_lengths)) for run_lengths in _plane_run_lengths(data)])
+
+
+def compressed_size(data: ByteString) -> int:
+    """Return the size of compress(data) without building the compressed data."""
+    return encoding(data).size
+
+
+def _encode_plane(buffer: bytearray, run_lengths: List[Tuple[int, int]], read_length: int):
+    min_run_length = 3 + read_length
+    flag = 0x80 << (8 * read_length)
+    max_run_length = flag - 1
+    unique = bytearray()
+
+    buffer.append(read_length + 1)
+
+    def flush_unique():
+        buffer.extend(len(unique).to_bytes(read_length + 1, 'big'))
+        buffer.extend(unique)
+        unique.clear()
+
+    for value, run_length in run_lengths:
+        while run_length > 0:
+            if run_length >= min_run_length:
+                if len(unique) > 0:  # Preceded by unique values
+                    flush_unique()
+                length = flag | min(run_length, max_run_length)
+                buffer.extend(length.to_bytes(read_length + 1, 'big'))
+                buffer.append(value)
             else:
-                run_lengths.append((prev, count))
-                count = 1
-        run_lengths.append((curr, count))
-
-        # Try each read length
-        buffers = (bytearray(), bytearray())
-        for read_length, buffer in enumerate(buffers):
-            min_run_length = 3 + read_length
-            flag = 0x80 << (8 * read_length)
-            max_run_length = flag - 1
-            unique = bytearray()
-
-            buffer.append(read_length + 1)
-
-            def flush_unique():
-                buffer.extend(len(unique).to_bytes(read_length + 1, 'big'))
-                buffer.extend(unique)
-                unique.clear()
-
-            for value, run_length in run_lengths:
-                while run_length > 0:
-                    if run_length >= min_run_length:
-                        if len(unique) > 0:  # Preceded by unique values
-                            flush_unique()
-                        length = flag | min(run_length, max_run_length)
-                        buffer.extend(length.to_bytes(read_length + 1, 'big'))
-                        buffer.append(value)
-                    else:
-                        if len(unique) + run_length > max_run_length:  # Total count would be too long
-                            flush_unique()
-                        unique.extend([value] * run_length)
-                    run_length -= max_run_length
-            if len(unique) > 0:
-                flush_unique()
-            buffer.extend((0).to_bytes(read_length + 1, 'big'))
-            # Copy the shorter one
-            compressed.extend(min(buffers, key=len))
-
-    return bytes(compressed)
+                if len(unique) + run_length > max_run_length:  # Total count would be too long
+                    flush_unique()
+                unique.extend([value] * run_length)
+            run_length -= max_run_length
+    if len(unique) > 0:
+        flush_unique()
+    buffer.extend((0).to_bytes(read_length + 1, 'big'))
+
+
+def compress(data: ByteString):
+    # Only encodes the read length that gives the shorter output
+    return encoding(data).encode()
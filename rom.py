@@ -11,7 +11,7 @@ from BaseClasses import ItemClassification, Location
 import Utils
 from worlds.Files import APPatchExtension, APProcedurePatch, APTokenMixin, APTokenTypes, InvalidDataError
 
-from . import rom_data
+from . import compression_cache, patch_deltas, rom_data
 from .data import encode_str, get_rom_address, get_width_of_encoded_string, symbols_hash
 from .items import AP_MZM_ID_BASE, ItemID, ItemType, item_data_table
 from .nonnative_items import get_zero_mission_sprite
@@ -36,19 +36,25 @@ class MZMPatchExtensions(APPatchExtension):
 
     @staticmethod
     def add_decompressed_graphics(caller: APProcedurePatch, rom: bytes):
-        return rom_data.add_item_sprites(rom)
+        return rom_data.add_item_sprites(rom, caller.session)
 
     @staticmethod
     def add_unknown_item_graphics(caller: APProcedurePatch, rom: bytes) -> bytes:
-        return rom_data.use_unknown_item_sprites(rom)
+        return rom_data.use_unknown_item_sprites(rom, caller.session)
 
     @staticmethod
     def apply_background_patches(caller: APProcedurePatch, rom: bytes) -> bytes:
-        return rom_data.apply_always_background_patches(rom)
+        patched = patch_deltas.apply_patch_deltas(rom, [patch_deltas.BACKGROUND])
+        if patched is not None:
+            return patched
+        return rom_data.apply_always_background_patches(rom, caller.session)
 
     @staticmethod
     def apply_layout_patches(caller: APProcedurePatch, rom: bytes, patches: Sequence[str]) -> bytes:
-        return rom_data.apply_layout_patches(rom, set(patches))
+        patched = patch_deltas.apply_patch_deltas(rom, [patch_deltas.LAYOUT, *patches])
+        if patched is not None:
+            return patched
+        return rom_data.apply_layout_patches(rom, set(patches), caller.session)
 
 
 class MZMProcedurePatch(APProcedurePatch, APTokenMixin):
@@ -59,6 +65,8 @@ class MZMProcedurePatch(APProcedurePatch, APTokenMixin):
 
     def __init__(self, *args, **kwargs):
         super(MZMProcedurePatch, self).__init__(*args, **kwargs)
+        # Lets the patch steps reuse what earlier steps read from the ROM
+        self.session = rom_data.PatchSession()
         self.procedure = [
             ("check_symbol_hash", [symbols_hash]),
             ("apply_bsdiff4", ["basepatch.bsdiff"]),
@@ -67,6 +75,14 @@ class MZMProcedurePatch(APProcedurePatch, APTokenMixin):
             ("apply_background_patches", []),
         ]
 
+    def patch(self, target: str) -> None:
+        compression_cache.cache.directory = compression_cache.default_directory()
+        try:
+            super(MZMProcedurePatch, self).patch(target)
+        finally:
+            # The session holds copies of the ROM, which aren't needed once it's written
+            self.session.clear()
+
     @classmethod
     def get_source_data(cls) -> bytes:
         with open(get_base_rom_path(), "rb") as stream:
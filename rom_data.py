@@ -1,21 +1,44 @@
 from enum import IntEnum
 import itertools
+import json
 import struct
-from typing import Callable, Mapping, NamedTuple, Optional, Sequence, Set, Tuple, Union
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Set, Tuple, Union
 
-from . import lz10, rle, iterators
-from .data import get_rom_address, get_symbol
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import compression_cache, lz10, rle
+from .data import data_path, get_rom_address, get_symbol
 
 
 ByteString = Union[bytes, bytearray, memoryview]
 
 
-def decompress_data(rom: bytes, src: Union[str, int]):
+def decompress_data(rom: bytes, src: Union[str, int], scratch: Optional[bytearray] = None) -> ByteString:
+    """
+    Decompress LZ77-compressed data from the ROM. If a scratch buffer is given, the data is decoded
+    into it and a view of it is returned, which is only valid until the buffer is reused.
+    """
     if isinstance(src, str):
         address = get_rom_address(src)
     else:
         address = src
-    return bytes(lz10.decompress(memoryview(rom)[address:]))
+    if scratch is None:
+        return bytes(lz10.decompress(memoryview(rom)[address:]))
+    compressed = memoryview(rom)[address:]
+    lz10.decompress_into(compressed, scratch)
+    return memoryview(scratch)[:lz10.decompressed_size(compressed)].toreadonly()
+
+
+def graphics_scratch_buffer() -> bytearray:
+    """
+    Make a scratch buffer for decompress_data that's large enough for any sprite graphics. The item sprite
+    patches share one, since each graphic is only needed until the next one is decompressed.
+    """
+    # Sprite graphics can't be larger than object VRAM
+    return bytearray(0x8000)
 
 
 def write_data(rombuffer: bytearray, data: bytes, dst: Union[str, int]):
@@ -66,19 +89,22 @@ def write_palette_pointer(rombuffer: bytearray, palette_name: str, index: int):
                get_symbol("sItemGfxPointers", 8 * index + 4))  # sItemGfxPointers[index].palette
 
 
-def add_item_sprites(rom: bytes) -> bytes:
-    rombuffer = bytearray(rom)
+def add_item_sprites(rom: bytes, session: Optional["PatchSession"] = None) -> bytes:
+    if session is None:
+        session = PatchSession()
+    rombuffer = session.begin(rom)
+    scratch = graphics_scratch_buffer()
 
     # Tanks are already in needed format
     # Plasma Beam, Gravity Suit, and Space Jump are by default custom and already in ROM
 
     # Long Beam
-    long_statue = decompress_data(rom, "sChozoStatueLongBeamGfx")
+    long_statue = decompress_data(rom, "sChozoStatueLongBeamGfx", scratch)
     long = extract_chozo_statue_sprite(long_statue)
     write_data(rombuffer, long, "sRandoLongBeamGfx")
 
     # Charge Beam
-    charge = decompress_data(rom, "sChargeBeamGfx")
+    charge = decompress_data(rom, "sChargeBeamGfx", scratch)
     charge1 = get_sprites(charge, 18, 0, 1)
     charge2 = get_sprites(charge, 20, 0, 1)
     charge3 = bytearray(charge1)
@@ -86,27 +112,27 @@ def add_item_sprites(rom: bytes) -> bytes:
     write_data(rombuffer, bytes(charge1 + charge2 + charge3 + charge2), "sRandoChargeBeamGfx")
 
     # Ice Beam
-    ice_statue = decompress_data(rom, "sChozoStatueIceBeamGfx")
+    ice_statue = decompress_data(rom, "sChozoStatueIceBeamGfx", scratch)
     ice = extract_chozo_statue_sprite(ice_statue)
     write_data(rombuffer, ice, "sRandoIceBeamGfx")
 
     # Wave Beam
-    wave_statue = decompress_data(rom, "sChozoStatueWaveBeamGfx")
+    wave_statue = decompress_data(rom, "sChozoStatueWaveBeamGfx", scratch)
     wave = extract_chozo_statue_sprite(wave_statue)
     write_data(rombuffer, wave, "sRandoWaveBeamGfx")
 
     # Bomb
-    bomb_statue = decompress_data(rom, "sChozoStatueBombsGfx")
+    bomb_statue = decompress_data(rom, "sChozoStatueBombsGfx", scratch)
     bomb = extract_chozo_statue_sprite(bomb_statue)
     write_data(rombuffer, bomb, "sRandoBombGfx")
 
     # Varia Suit
-    varia_statue = decompress_data(rom, "sChozoStatueVariaGfx")
+    varia_statue = decompress_data(rom, "sChozoStatueVariaGfx", scratch)
     varia = extract_chozo_statue_sprite(varia_statue)
     write_data(rombuffer, varia, "sRandoVariaSuitGfx")
 
     # Morph Ball
-    morph = decompress_data(rom, "sMorphBallGfx")
+    morph = decompress_data(rom, "sMorphBallGfx", scratch)
     morph_core = get_sprites(morph, 0, 0, 3)
     morph_glass = get_sprites(morph, 6, 0, 1)
     morph_composited = bytearray(len(morph_core))
@@ -126,50 +152,53 @@ def add_item_sprites(rom: bytes) -> bytes:
     write_data(rombuffer, make_4_frame_animation(morph_composited), "sRandoMorphBallGfx")
 
     # Speed Booster
-    speed_statue = decompress_data(rom, "sChozoStatueSpeedboosterGfx")
+    speed_statue = decompress_data(rom, "sChozoStatueSpeedboosterGfx", scratch)
     speed = extract_chozo_statue_sprite(speed_statue)
     write_data(rombuffer, speed, "sRandoSpeedBoosterGfx")
 
     # Hi-Jump Boots
-    hijump_statue = decompress_data(rom, "sChozoStatueHighJumpGfx")
+    hijump_statue = decompress_data(rom, "sChozoStatueHighJumpGfx", scratch)
     hijump = extract_chozo_statue_sprite(hijump_statue)
     write_data(rombuffer, hijump, "sRandoHiJumpGfx")
 
     # Screw Attack
-    screw_statue = decompress_data(rom, "sChozoStatueScrewAttackGfx")
+    screw_statue = decompress_data(rom, "sChozoStatueScrewAttackGfx", scratch)
     screw = extract_chozo_statue_sprite(screw_statue)
     write_data(rombuffer, screw, "sRandoScrewAttackGfx")
 
     # Power Grip
-    powergrip = decompress_data(rom, "sPowerGripGfx")
+    powergrip = decompress_data(rom, "sPowerGripGfx", scratch)
     powergrip = get_sprites(powergrip, 0, 0, 3)
     write_data(rombuffer, make_4_frame_animation(powergrip), "sRandoPowerGripGfx")
 
-    return bytes(rombuffer)
+    return session.end()
 
 
-def use_unknown_item_sprites(rom: bytes) -> bytes:
-    rombuffer = bytearray(rom)
+def use_unknown_item_sprites(rom: bytes, session: Optional["PatchSession"] = None) -> bytes:
+    if session is None:
+        session = PatchSession()
+    rombuffer = session.begin(rom)
+    scratch = graphics_scratch_buffer()
 
     # Plasma Beam
-    plasma_statue = decompress_data(rom, "sChozoStatuePlasmaBeamGfx")
+    plasma_statue = decompress_data(rom, "sChozoStatuePlasmaBeamGfx", scratch)
     plasma = extract_unknown_chozo_statue_sprite(plasma_statue, 4)
     write_data(rombuffer, plasma, "sRandoPlasmaBeamGfx")
     write_palette_pointer(rombuffer, "sChozoStatuePlasmaBeamPal", 8)
 
     # Gravity Suit
-    gravity_statue = decompress_data(rom, "sChozoStatueGravitySuitGfx")
+    gravity_statue = decompress_data(rom, "sChozoStatueGravitySuitGfx", scratch)
     gravity = extract_unknown_chozo_statue_sprite(gravity_statue, 2)
     write_data(rombuffer, gravity, "sRandoGravitySuitGfx")
     write_palette_pointer(rombuffer, "sChozoStatueGravitySuitPal", 11)
 
     # Space Jump
-    space_statue = decompress_data(rom, "sChozoStatueSpaceJumpGfx")
+    space_statue = decompress_data(rom, "sChozoStatueSpaceJumpGfx", scratch)
     spacejump = extract_unknown_chozo_statue_sprite(space_statue, 2)
     write_data(rombuffer, spacejump, "sRandoSpaceJumpGfx")
     write_palette_pointer(rombuffer, "sChozoStatueSpaceJumpPal", 16)
 
-    return bytes(rombuffer)
+    return session.end()
 
 
 class BackgroundProperties(IntEnum):
@@ -223,13 +252,28 @@ class SpriteData(NamedTuple):
         return struct.pack("<BBB", self.y, self.x, 17 + self.spriteset_index)
 
 
-class RoomInfo(NamedTuple):
-    bg0: BackgroundInfo
-    bg1: BackgroundInfo
-    bg2: BackgroundInfo
-    bg3: BackgroundInfo
-    clipdata: BackgroundInfo
+class RoomInfo:
+    """
+    A room entry. The entry is unpacked once, and each layer's BackgroundInfo is only made the first
+    time it's used.
+    """
+    __slots__ = ("rom", "default_sprite_data_address", "_properties", "_pointers", "_layers")
+
+    _entry = struct.Struct("<xBBBBxxxIIIIIxxxxI")
+
+    rom: memoryview
     default_sprite_data_address: int
+    _properties: Tuple[int, int, int, int, int]
+    _pointers: Tuple[int, int, int, int, int]
+    _layers: List[Optional[BackgroundInfo]]
+
+    def __init__(self, rom: memoryview, properties: Tuple[int, int, int, int, int],
+                 pointers: Tuple[int, int, int, int, int], default_sprite_data_address: int):
+        self.rom = rom
+        self._properties = properties
+        self._pointers = pointers
+        self.default_sprite_data_address = default_sprite_data_address
+        self._layers = [None] * 5
 
     @classmethod
     def from_pointer(cls, rom: ByteString, ptr: int):
@@ -237,14 +281,40 @@ class RoomInfo(NamedTuple):
         (bg0_prop, bg1_prop, bg2_prop, bg3_prop,
          bg0_ptr, bg1_ptr, bg2_ptr, clipdata_ptr, bg3_ptr,
          default_sprite_ptr
-        ) = struct.unpack_from("<xBBBBxxxIIIIIxxxxI", rom, ptr)
-        bg0 = BackgroundInfo.from_data(rom, bg0_prop, bg0_ptr)
-        bg1 = BackgroundInfo.from_data(rom, bg1_prop, bg1_ptr)
-        bg2 = BackgroundInfo.from_data(rom, bg2_prop, bg2_ptr)
-        bg3 = BackgroundInfo.from_data(rom, bg3_prop, bg3_ptr)
-        clipdata = BackgroundInfo.from_data(rom, BackgroundProperties.RLE_COMPRESSED, clipdata_ptr)
-        default_sprites = default_sprite_ptr & (0x8000000 - 1)
-        return cls(bg0, bg1, bg2, bg3, clipdata, default_sprites)
+        ) = cls._entry.unpack_from(rom, ptr)
+        if not isinstance(rom, memoryview):
+            rom = memoryview(rom)
+        return cls(rom,
+                   (bg0_prop, bg1_prop, bg2_prop, bg3_prop, BackgroundProperties.RLE_COMPRESSED),
+                   (bg0_ptr, bg1_ptr, bg2_ptr, bg3_ptr, clipdata_ptr),
+                   default_sprite_ptr & (0x8000000 - 1))
+
+    def _layer(self, index: int) -> BackgroundInfo:
+        layer = self._layers[index]
+        if layer is None:
+            layer = BackgroundInfo(self.rom, BackgroundProperties(self._properties[index]), self._pointers[index])
+            self._layers[index] = layer
+        return layer
+
+    @property
+    def bg0(self) -> BackgroundInfo:
+        return self._layer(0)
+
+    @property
+    def bg1(self) -> BackgroundInfo:
+        return self._layer(1)
+
+    @property
+    def bg2(self) -> BackgroundInfo:
+        return self._layer(2)
+
+    @property
+    def bg3(self) -> BackgroundInfo:
+        return self._layer(3)
+
+    @property
+    def clipdata(self) -> BackgroundInfo:
+        return self._layer(4)
 
 
 class Area(IntEnum):
@@ -282,20 +352,65 @@ class Clipdata(IntEnum):
     UNDERWATER_ENERGY_TANK = 0x7C
 
 
+class Rectangle(NamedTuple):
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+class TileEdit(NamedTuple):
+    x: int
+    y: int
+    tile: int
+    original_tile: Optional[int] = None
+
+
+# A region of a tilemap: the whole tilemap, a rectangle, or a (height, width) grid of booleans
+Region = Union[None, Rectangle, Sequence[Sequence[bool]]]
+
+
+def _check_halfword(value: int, name: str):
+    if not 0 <= value <= 0xFFFF:
+        raise ValueError(f"{name} {value:04x} doesn't fit in a halfword")
+
+
 class BackgroundTilemap:
     width: int
     height: int
     compression: BackgroundProperties
     bg_size: Optional[int]
-    decompressed: bytearray
-    max_compressed_size: Optional[int]
-
-    def __init__(self, compressed_data: memoryview, compression: BackgroundProperties, max_compressed_size: Optional[int] = None):
+    first_change: Optional[int]
+    _compressed_data: memoryview
+    _original_compressed_size: Optional[int]
+    _max_compressed_size: Optional[int]
+    _limit_to_original_size: bool
+    # Nothing is decompressed until the tiles are needed
+    _decompressed: Optional[bytearray]
+    # RLE tilemaps are decoded a row at a time until the whole tilemap is needed
+    _run_index: Optional[rle.RunIndex]
+    _rows: Dict[int, bytearray]
+
+    def __init__(self, compressed_data: memoryview, compression: BackgroundProperties, max_compressed_size: Optional[int] = None,
+                 decompressed: Optional[ByteString] = None, original_compressed_size: Optional[int] = None):
+        """
+        `decompressed` can be given when the tiles were already decoded from `compressed_data`, along with
+        the compressed size if it's known, so that nothing is decoded again.
+        """
+        self._compressed_data = compressed_data
+        self._original_compressed_size = original_compressed_size
+        self._decompressed = None if decompressed is None else bytearray(decompressed)
+        self._run_index = None
+        self._rows = {}
         if compression & BackgroundProperties.RLE_COMPRESSED:
             self.width = compressed_data[0]
             self.height = compressed_data[1]
             self.compression = BackgroundProperties.RLE_COMPRESSED
-            self.decompressed = rle.decompress(compressed_data[2:])
+            if self._decompressed is None or original_compressed_size is None:
+                self._run_index = rle.RunIndex(compressed_data[2:])
+                self._original_compressed_size = 2 + self._run_index.footprint
+            if self._decompressed is not None:
+                self._run_index = None
         elif compression & BackgroundProperties.LZ77_COMPRESSED:
             self.bg_size = compressed_data[0]
             self.width = self.height = 256 // 8
@@ -304,34 +419,287 @@ class BackgroundTilemap:
             if self.bg_size & 2:
                 self.height *= 2
             self.compression = BackgroundProperties.LZ77_COMPRESSED
-            self.decompressed = lz10.decompress(compressed_data[4:])
         else:
             raise ValueError(f"Invalid background properties: {compression:02x}")
         self.max_compressed_size = max_compressed_size
+        self.first_change = None
 
     @classmethod
-    def from_info(cls, info: BackgroundInfo, max_compressed_size: Optional[int] = None):
-        return cls(info.compressed_data(), info.properties, max_compressed_size)
+    def from_info(cls, info: BackgroundInfo, max_compressed_size: Optional[int] = None,
+                  decompressed: Optional[ByteString] = None, original_compressed_size: Optional[int] = None):
+        """Read a tilemap from ROM. Unless a size limit is given, it can't grow past its original size."""
+        tilemap = cls(info.compressed_data(), info.properties, max_compressed_size, decompressed, original_compressed_size)
+        if max_compressed_size is None:
+            tilemap._limit_to_original_size = True
+        return tilemap
+
+    @property
+    def decompressed(self) -> bytearray:
+        if self._decompressed is None:
+            if self._run_index is None:
+                self._decompressed, footprint = lz10.decompress_with_footprint(self._compressed_data[4:])
+                self._original_compressed_size = 4 + footprint
+            else:
+                self._decompressed = self._run_index.read(0, len(self._run_index))
+                for y, row in self._rows.items():
+                    self._decompressed[2 * self.width * y:2 * self.width * (y + 1)] = row
+                self._run_index = None
+                self._rows.clear()
+        return self._decompressed
+
+    @property
+    def original_compressed_size(self) -> int:
+        if self._original_compressed_size is None:
+            # The end of LZ77 data is only found by decompressing it
+            if self._decompressed is None:
+                self.decompressed
+            else:
+                self._original_compressed_size = 4 + lz10.decompress_with_footprint(self._compressed_data[4:])[1]
+        return self._original_compressed_size
+
+    @property
+    def original_data(self) -> memoryview:
+        return self._compressed_data[:self.original_compressed_size]
+
+    @property
+    def max_compressed_size(self) -> Optional[int]:
+        if self._limit_to_original_size:
+            if self.compression == BackgroundProperties.LZ77_COMPRESSED:
+                # LZ77 data is padded to a multiple of 4 bytes, so that's the space it takes
+                return (self.original_compressed_size + 3) & ~3
+            return self.original_compressed_size
+        return self._max_compressed_size
+
+    @max_compressed_size.setter
+    def max_compressed_size(self, size: Optional[int]):
+        self._max_compressed_size = size
+        self._limit_to_original_size = False
+
+    @property
+    def changed(self) -> bool:
+        return self.first_change is not None
+
+    def _row(self, y: int) -> memoryview:
+        """Get row `y` as writable halfwords. Tilemaps are little-endian, like every platform we run on."""
+        if self._run_index is None:
+            return memoryview(self.decompressed)[2 * self.width * y:2 * self.width * (y + 1)].cast("H")
+        row = self._rows.get(y)
+        if row is None:
+            row = self._rows[y] = self._run_index.read(self.width * y, self.width * (y + 1))
+        return memoryview(row).cast("H")
+
+    @property
+    def tiles(self):
+        """
+        A read-only view of the tiles that shares the decompressed buffer, indexed as tiles[y][x]. With NumPy
+        this is a (height, width) uint16 array; otherwise it's a tuple of rows of halfwords. Edits go through
+        set so that they're tracked.
+        """
+        if numpy is not None:
+            tiles = numpy.frombuffer(self.decompressed, dtype="<u2").reshape(self.height, self.width)
+            tiles.flags.writeable = False
+            return tiles
+        halfwords = memoryview(self.decompressed).toreadonly().cast("H")
+        return tuple(halfwords[y * self.width:(y + 1) * self.width] for y in range(self.height))
+
+    def get(self, x: int, y: int) -> int:
+        return self._row(y)[x]
 
     def set(self, x: int, y: int, tile: int, original_tile: Optional[int] = None):
-        index = (y * self.width + x) * 2
-        if original_tile is not None:
-            found_tile = int.from_bytes(self.decompressed[index:index + 2], "little")
-            if found_tile != original_tile:
-                raise ValueError(f"Unexpected tile at ({x}, {y}) (expected {original_tile:04x}, found {found_tile:04x})")
-        self.decompressed[index:index + 2] = tile.to_bytes(2, "little")
-
-    def to_compressed_data(self) -> bytes:
+        row = self._row(y)
+        if original_tile is not None and row[x] != original_tile:
+            raise ValueError(f"Unexpected tile at ({x}, {y}) (expected {original_tile:04x}, found {row[x]:04x})")
+        if row[x] != tile:
+            row[x] = tile
+            self._mark_changed((y * self.width + x) * 2)
+
+    def apply_edits(self, edits: Iterable[TileEdit]):
+        """
+        Make several edits at once. Every tile is checked before anything is written, and all the tiles
+        that are out of bounds or don't have their expected value are reported together.
+        """
+        edits = [TileEdit(*edit) for edit in edits]
+        if not edits:
+            return
+        errors = []
+
+        if numpy is not None:
+            tiles = numpy.frombuffer(self.decompressed, dtype="<u2").reshape(self.height, self.width)
+            xs, ys, new_tiles, original_tiles = numpy.array(
+                [(x, y, tile, -1 if original_tile is None else original_tile) for x, y, tile, original_tile in edits],
+                dtype=numpy.int64
+            ).T
+            outside = (xs < 0) | (xs >= self.width) | (ys < 0) | (ys >= self.height)
+            found = tiles[numpy.where(outside, 0, ys), numpy.where(outside, 0, xs)]
+            # Assigning to the uint16 tiles would silently wrap values that don't fit
+            invalid = (new_tiles < 0) | (new_tiles > 0xFFFF)
+            unexpected = ~outside & (original_tiles >= 0) & (found != original_tiles)
+            for i in numpy.flatnonzero(outside | invalid | unexpected).tolist():
+                errors.append(self._edit_error(edits[i], None if outside[i] else int(found[i])))
+            if errors:
+                raise ValueError(f"{len(errors)} invalid edits: " + "; ".join(errors))
+            changed = numpy.flatnonzero(found != new_tiles)
+            tiles[ys, xs] = new_tiles
+            if len(changed) > 0:
+                self._mark_changed(2 * int((ys[changed] * self.width + xs[changed]).min()))
+            return
+
+        for edit in edits:
+            if not (0 <= edit.x < self.width and 0 <= edit.y < self.height):
+                errors.append(self._edit_error(edit, None))
+            elif (not 0 <= edit.tile <= 0xFFFF
+                  or edit.original_tile is not None and self.get(edit.x, edit.y) != edit.original_tile):
+                errors.append(self._edit_error(edit, self.get(edit.x, edit.y)))
+        if errors:
+            raise ValueError(f"{len(errors)} invalid edits: " + "; ".join(errors))
+        for x, y, tile, _ in edits:
+            row = self._row(y)
+            if row[x] != tile:
+                row[x] = tile
+                self._mark_changed((y * self.width + x) * 2)
+
+    @staticmethod
+    def _edit_error(edit: TileEdit, found_tile: Optional[int]) -> str:
+        if found_tile is None:
+            return f"({edit.x}, {edit.y}) is out of bounds"
+        if not 0 <= edit.tile <= 0xFFFF:
+            return f"tile {edit.tile:04x} for ({edit.x}, {edit.y}) doesn't fit in a halfword"
+        return f"unexpected tile at ({edit.x}, {edit.y}) (expected {edit.original_tile:04x}, found {found_tile:04x})"
+
+    def _mark_changed(self, index: int):
+        if self.first_change is None or index < self.first_change:
+            self.first_change = index
+
+    def _check_region(self, region: Region):
+        if isinstance(region, Rectangle):
+            if (region.x < 0 or region.y < 0 or region.width < 0 or region.height < 0
+                    or region.x + region.width > self.width or region.y + region.height > self.height):
+                raise ValueError(f"{region} is outside the {self.width}x{self.height} tilemap")
+        elif region is not None:
+            if len(region) != self.height or any(len(row) != self.width for row in region):
+                raise ValueError(f"Region grid doesn't match the {self.width}x{self.height} tilemap")
+
+    @staticmethod
+    def _check_table(highest_tile: int, table_size: Optional[int]):
+        if table_size is not None and highest_tile >= table_size:
+            raise ValueError(f"Table has {table_size} entries, but the region has tile {highest_tile:04x}")
+
+    def _transform(self, vectorized: Callable, function: Callable[[int], int], region: Region,
+                   table_size: Optional[int] = None):
+        """Replace each tile in `region` by the result of `function`, or with NumPy, by the result of
+        `vectorized` on an array of the tiles. If `table_size` is given, every tile in `region` must be below it."""
+        self._check_region(region)
+        if numpy is not None:
+            tiles = numpy.frombuffer(self.decompressed, dtype="<u2").reshape(self.height, self.width)
+            if region is None:
+                selection = ...
+            elif isinstance(region, Rectangle):
+                selection = (slice(region.y, region.y + region.height), slice(region.x, region.x + region.width))
+            else:
+                selection = numpy.asarray(region, dtype=bool)
+            selected = tiles[selection]
+            self._check_table(int(selected.max()) if selected.size > 0 else -1, table_size)
+            before = tiles.copy()
+            tiles[selection] = vectorized(selected)
+            changed = numpy.flatnonzero(tiles != before)
+            if len(changed) > 0:
+                self._mark_changed(int(changed[0]) * 2)
+            return
+
+        if region is None:
+            region = Rectangle(0, 0, self.width, self.height)
+        if isinstance(region, Rectangle):
+            cells = [(y, range(region.x, region.x + region.width)) for y in range(region.y, region.y + region.height)]
+        else:
+            cells = [(y, [x for x, selected in enumerate(row) if selected]) for y, row in enumerate(region)]
+        if table_size is not None:
+            self._check_table(max((self._row(y)[x] for y, xs in cells for x in xs), default=-1), table_size)
+        for y, xs in cells:
+            row = self._row(y)
+            for x in xs:
+                tile = function(row[x])
+                if tile != row[x]:
+                    row[x] = tile
+                    self._mark_changed((y * self.width + x) * 2)
+
+    def mask(self, mask: int, region: Region = None):
+        """Clear the bits that aren't set in `mask` from every tile in `region`."""
+        _check_halfword(mask, "Mask")
+        self._transform(lambda tiles: tiles & mask, lambda tile: tile & mask, region)
+
+    def add_flags(self, flags: int, region: Region = None):
+        """Set the bits in `flags` on every tile in `region`."""
+        _check_halfword(flags, "Flags")
+        self._transform(lambda tiles: tiles | flags, lambda tile: tile | flags, region)
+
+    def replace(self, old_tile: int, new_tile: int, region: Region = None):
+        """Change every `old_tile` in `region` to `new_tile`."""
+        _check_halfword(new_tile, "Tile")
+        self._transform(lambda tiles: numpy.where(tiles == old_tile, new_tile, tiles),
+                        lambda tile: new_tile if tile == old_tile else tile, region)
+
+    def remap(self, table: Sequence[int], region: Region = None):
+        """Change every tile in `region` to `table[tile]`."""
+        for tile in table:
+            _check_halfword(tile, "Tile")
+        if numpy is not None:
+            lookup = numpy.asarray(table, dtype=numpy.uint16)
+        self._transform(lambda tiles: lookup[tiles], lambda tile: table[tile], region, len(table))
+
+    def compressed_size(self, level: Optional[int] = None) -> int:
+        """Return the size of the tilemap compressed at `level` (greedy by default), without building it."""
         if self.compression == BackgroundProperties.RLE_COMPRESSED:
-            compressed_data = bytes((self.width, self.height)) + rle.compress(self.decompressed)
+            return 2 + rle.compressed_size(self.decompressed)
         if self.compression == BackgroundProperties.LZ77_COMPRESSED:
-            compressed_data = self.bg_size.to_bytes(4, "little") + lz10.compress(self.decompressed)
-        if self.max_compressed_size is not None and len(compressed_data) > self.max_compressed_size:
-            raise ValueError(f"Compressed size over limit (size: {len(compressed_data)}, limit: {self.max_compressed_size})")
+            tokens = compression_cache.lz10_tokenize(self.decompressed, lz10.GREEDY if level is None else level)
+            return 4 + lz10.encoded_size(tokens)
+
+    def _check_size(self, size: int):
+        if self.max_compressed_size is not None and size > self.max_compressed_size:
+            raise ValueError(f"Compressed size over limit (size: {size}, limit: {self.max_compressed_size})")
+
+    def to_compressed_data(self, level: Optional[int] = None) -> ByteString:
+        """
+        Compress the tilemap. `level` selects the LZ77 compression level. By default, an unchanged
+        tilemap returns its original data, and otherwise the original data is reused up to the first
+        changed tile and the rest is compressed greedily; the whole tilemap is only recompressed, greedily
+        and then optimally, when that is over the size limit. RLE compression has no levels.
+        """
+        if level is None and not self.changed:
+            compressed_data = self.original_data
+        elif self.compression == BackgroundProperties.RLE_COMPRESSED:
+            encoding = None
+            if self.max_compressed_size is not None:
+                # Measure the data before encoding it, without finding its runs twice
+                encoding = rle.encoding(self.decompressed)
+                self._check_size(2 + encoding.size)
+            compressed_data = bytes((self.width, self.height)) + compression_cache.rle_compress(self.decompressed, encoding)
+        elif self.compression == BackgroundProperties.LZ77_COMPRESSED:
+            header = self.bg_size.to_bytes(4, "little")
+            if level is None:
+                compressed_data = header + compression_cache.lz10_compress_incremental(
+                    self.decompressed, self.original_data[4:], self.first_change)
+                if self.max_compressed_size is not None and len(compressed_data) > self.max_compressed_size:
+                    fits = self.compressed_size(lz10.GREEDY) <= self.max_compressed_size
+                    level = lz10.GREEDY if fits else lz10.OPTIMAL
+            if level is not None:
+                # Check the size before building the data
+                self._check_size(self.compressed_size(level))
+                compressed_data = header + lz10.encode_tokens(compression_cache.lz10_tokenize(self.decompressed, level))
+        self._check_size(len(compressed_data))
         return compressed_data
 
     def to_halfword_matrix(self) -> Sequence[Sequence[int]]:
-        return tuple(iterators.batched(itertools.chain.from_iterable(struct.iter_unpack("<H", self.decompressed)), self.width))
+        tiles = self.tiles
+        if numpy is not None:
+            return tiles.tolist()
+        return [row.tolist() for row in tiles]
+
+
+def write_tilemap(rombuffer: bytearray, tilemap: BackgroundTilemap, info: BackgroundInfo):
+    """Write a tilemap read from `info` back in its place. Unchanged tilemaps are already there, so they're skipped."""
+    if tilemap.changed:
+        write_data(rombuffer, tilemap.to_compressed_data(), info.rom_address())
 
 
 def print_room_data(room: BackgroundTilemap):
@@ -343,13 +711,121 @@ def read_u32(rom, addr):
     return int.from_bytes(rom[addr:addr + 4], "little")
 
 
+class RoomIndex:
+    """
+    The room entries of a ROM. Each area's entry array is located once, and each room's entry is parsed
+    the first time it's used. Calling the index with an area and room returns that room's RoomInfo.
+    """
+
+    def __init__(self, rom: ByteString):
+        self.rom = rom
+        # Shared by the BackgroundInfo of every room
+        self._view = memoryview(rom)
+        self._room_entries: Dict[int, int] = {}
+        self._rooms: Dict[Tuple[int, int], RoomInfo] = {}
+
+    def _room_entry_array(self, area: int) -> int:
+        room_entries = self._room_entries.get(area)
+        if room_entries is None:
+            room_entry_pointer_array_addr = get_rom_address("sAreaRoomEntryPointers")
+            room_entries = read_u32(self.rom, (room_entry_pointer_array_addr + 4 * area) & (0x8000000 - 1))
+            room_entries &= 0x8000000 - 1
+            self._room_entries[area] = room_entries
+        return room_entries
+
+    def __call__(self, area: int, room: int) -> RoomInfo:
+        room_info = self._rooms.get((area, room))
+        if room_info is None:
+            room_info = RoomInfo.from_pointer(self._view, self._room_entry_array(area) + 60 * room)
+            self._rooms[area, room] = room_info
+        return room_info
+
+    def room_count(self, area: int) -> int:
+        """Count the rooms of an area. The entry array is terminated by an entry with tileset 0xFF."""
+        room_entries = self._room_entry_array(area)
+        rooms = 0
+        while self.rom[room_entries + 60 * rooms] != 0xFF:
+            rooms += 1
+        return rooms
+
+    def rooms(self, area: int) -> Iterator[Tuple[int, RoomInfo]]:
+        """Iterate over every room of an area with its room number."""
+        for room in range(self.room_count(area)):
+            yield room, self(area, room)
+
+
 def background_extraction_function(rom: ByteString) -> Callable[[int, int], RoomInfo]:
-    def get_backgrounds(area, room):
-        room_entry_pointer_array_addr = get_rom_address("sAreaRoomEntryPointers")
-        room_entry_array_addr = read_u32(rom, (room_entry_pointer_array_addr + 4 * area) & (0x8000000 - 1))
-        room_entry_addr = (room_entry_array_addr + 60 * room) & (0x8000000 - 1)
-        return RoomInfo.from_pointer(rom, room_entry_addr)
-    return get_backgrounds
+    return RoomIndex(rom)
+
+
+class PatchSession:
+    """
+    What the patch steps of one patch application have read from the ROM, so that later steps don't read
+    it again. Each step starts with begin and returns the result of end. Everything is kept only while a
+    step starts from exactly the ROM that the previous one returned; if anything else changed it in
+    between, it's all read again.
+    """
+
+    rom: Optional[bytes]
+    rombuffer: bytearray
+    rooms: RoomIndex
+    # Compressed data, tiles, and compressed size of the tilemaps decoded so far, by address
+    _tilemaps: Dict[int, Tuple[bytes, bytes, int]]
+    # Whether a step began and hasn't ended; if it raised, the buffer may be half written
+    _in_step: bool
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Forget everything read so far, such as once patching is done."""
+        self.rom = None
+        self.rombuffer = bytearray()
+        self.rooms = RoomIndex(self.rombuffer)
+        self._tilemaps = {}
+        self._in_step = False
+
+    def begin(self, rom: bytes) -> bytearray:
+        """Start a patch step, returning the buffer to write its changes to."""
+        if self._in_step or rom is not self.rom and rom != self.rom:
+            self.clear()
+            self.rom = rom
+            self.rombuffer = bytearray(rom)
+            self.rooms = RoomIndex(self.rombuffer)
+        self._in_step = True
+        return self.rombuffer
+
+    def end(self) -> bytes:
+        self.rom = bytes(self.rombuffer)
+        self._in_step = False
+        return self.rom
+
+    def tilemap(self, info: BackgroundInfo, max_compressed_size: Optional[int] = None) -> BackgroundTilemap:
+        """Read a tilemap like BackgroundTilemap.from_info, reusing its tiles if they were decoded before."""
+        address = info.rom_address()
+        cached = self._tilemaps.get(address)
+        if cached is not None:
+            compressed_data, decompressed, compressed_size = cached
+            # The data may have been overwritten without going through the session
+            if self.rombuffer[address:address + len(compressed_data)] == compressed_data:
+                return BackgroundTilemap.from_info(info, max_compressed_size, decompressed, compressed_size)
+            del self._tilemaps[address]
+        return BackgroundTilemap.from_info(info, max_compressed_size)
+
+    def write_tilemap(self, tilemap: BackgroundTilemap, info: BackgroundInfo):
+        """Write a tilemap like write_tilemap, and keep its tiles for later steps."""
+        address = info.rom_address()
+        if tilemap.changed:
+            compressed_data = bytes(tilemap.to_compressed_data())
+            write_data(self.rombuffer, compressed_data, address)
+            compressed_size = len(compressed_data)
+            if tilemap.compression == BackgroundProperties.LZ77_COMPRESSED:
+                # Padding after LZ77 data isn't part of it, so measure the data without it
+                compressed_size = 4 + lz10.encoded_size(lz10.read_tokens(compressed_data[4:]), padding=1)
+            self._tilemaps[address] = (compressed_data, bytes(tilemap.decompressed), compressed_size)
+        elif tilemap._decompressed is not None:
+            self._tilemaps[address] = (bytes(tilemap.original_data), bytes(tilemap.decompressed),
+                                       tilemap.original_compressed_size)
 
 
 # Tuples are: Clipdata offset, BG1 offset, tank type
@@ -448,15 +924,24 @@ item_clipdata_and_gfx: Mapping[Area, Mapping[int, Sequence[Tuple[Optional[int],
 }
 
 
-def apply_always_background_patches(rom: bytes) -> bytes:
-    rombuffer = bytearray(rom)
-    get_backgrounds = background_extraction_function(rom)
+# Size limits of the tilemaps changed by apply_always_background_patches
+background_patch_limits: Mapping[Tuple[Area, int, str], int] = {
+    (Area.CHOZODIA, 10, "bg0"): 320,
+    (Area.CHOZODIA, 25, "bg0"): 356,
+}
+
+
+def apply_always_background_patches(rom: bytes, session: Optional[PatchSession] = None) -> bytes:
+    if session is None:
+        session = PatchSession()
+    rombuffer = session.begin(rom)
+    get_backgrounds = session.rooms
 
     # Item graphics and clipdata
     for area, rooms in item_clipdata_and_gfx.items():
         for room, items in rooms.items():
+            backgrounds = get_backgrounds(area, room)
             for i, (clip_offset, bg1_offset) in enumerate(items):
-                backgrounds = get_backgrounds(area, room)
                 if clip_offset is not None:
                     clipdata = rombuffer[backgrounds.clipdata.rom_address() + clip_offset]
                     behavior = (clipdata - Clipdata.ENERGY_TANK) & 0xF0
@@ -467,169 +952,124 @@ def apply_always_background_patches(rom: bytes) -> bytes:
 
     # Change the spotlight graphics so it always appears dark
     chozodia_before_map = get_backgrounds(Area.CHOZODIA, 10).bg0
-    chozodia_before_map_bg0 = BackgroundTilemap.from_info(chozodia_before_map, 320)
-    for y, row in enumerate(chozodia_before_map_bg0.to_halfword_matrix()):
-        for x, tile in enumerate(row):
-            tile_info = tile & 0x0FFF
-            chozodia_before_map_bg0.set(x, y, tile_info | (0 << 12))
-    write_data(rombuffer, chozodia_before_map_bg0.to_compressed_data(), chozodia_before_map.rom_address())
+    chozodia_before_map_bg0 = session.tilemap(chozodia_before_map, background_patch_limits[Area.CHOZODIA, 10, "bg0"])
+    chozodia_before_map_bg0.mask(0x0FFF)  # Use palette 0
+    session.write_tilemap(chozodia_before_map_bg0, chozodia_before_map)
     chozodia_dark_spotlight = get_backgrounds(Area.CHOZODIA, 25).bg0
-    chozodia_dark_spotlight_bg0 = BackgroundTilemap.from_info(chozodia_dark_spotlight, 356)
-    for y, row in enumerate(chozodia_dark_spotlight_bg0.to_halfword_matrix()):
-        for x, tile in enumerate(row):
-            tile_info = tile & 0x0FFF
-            chozodia_dark_spotlight_bg0.set(x, y, tile_info | (0 << 12))
-    write_data(rombuffer, chozodia_dark_spotlight_bg0.to_compressed_data(), chozodia_dark_spotlight.rom_address())
+    chozodia_dark_spotlight_bg0 = session.tilemap(chozodia_dark_spotlight, background_patch_limits[Area.CHOZODIA, 25, "bg0"])
+    chozodia_dark_spotlight_bg0.mask(0x0FFF)
+    session.write_tilemap(chozodia_dark_spotlight_bg0, chozodia_dark_spotlight)
 
-    return bytes(rombuffer)
+    return session.end()
 
 
-# Patches that require expanded space. These are not backwards compatible, so we keep a list and
-# apply only the ones that both the generator and the patcher have.
-expansion_required_patches = {
-    "brinstar_top",
-    "norfair_brinstar_elevator",
-    "crateria_water_speedway",
-    "crateria_left_of_grip",
-}
+class TilemapPatch(NamedTuple):
+    max_compressed_size: Optional[int]
+    edits: List[TileEdit]
+
+
+class CompiledLayoutPatches(NamedTuple):
+    tilemaps: Dict[Tuple[Area, int, str], TilemapPatch]
+    sprites: Dict[Tuple[Area, int], List[SpriteData]]
+
+
+def _tile_value(value: Union[int, str]) -> int:
+    """Tiles in the layout patch data are numbers, hexadecimal strings, or names of clipdata types."""
+    if isinstance(value, int):
+        return value
+    if value in Clipdata.__members__:
+        return Clipdata[value]
+    return int(value, 16)
 
 
-def apply_layout_patches(rom: bytes, patches: Set[str]) -> bytes:
-    rom = memoryview(rom)
-    rombuffer = bytearray(rom)
-    get_backgrounds = background_extraction_function(rom)
-
-    # Change the three beam blocks to never reform
-    long_beam_hall = get_backgrounds(Area.BRINSTAR, 4)
-    long_beam_hall_clipdata = BackgroundTilemap.from_info(long_beam_hall.clipdata, 142)
-    for x in range(29, 32):
-        long_beam_hall_clipdata.set(x, 8, Clipdata.BEAM_BLOCK_NEVER_REFORM, Clipdata.BEAM_BLOCK_NO_REFORM)
-    write_data(rombuffer, long_beam_hall_clipdata.to_compressed_data(), long_beam_hall.clipdata.rom_address())
-
-    if "brinstar_top" in patches:
-        # Create a slope instead of a wall to allow leaving Brinstar Top Missile room
-        brinstar_top = get_backgrounds(Area.BRINSTAR, 29)
-        brinstar_top_clipdata = BackgroundTilemap.from_info(brinstar_top.clipdata, 117)
-        brinstar_top_bg1 = BackgroundTilemap.from_info(brinstar_top.bg1, 287)
-        brinstar_top_clipdata.set(14, 5, Clipdata.STEEP_SLOPE_RISING, Clipdata.AIR)
-        brinstar_top_bg1.set(14, 5, 0x009E, 0x0106)
-        brinstar_top_bg1.set(14, 6, 0x00AE, 0x0116)
-        brinstar_top_clipdata.set(15, 4, Clipdata.STEEP_SLOPE_RISING, Clipdata.SOLID)
-        brinstar_top_bg1.set(15, 4, 0x009E, 0x0092)
-        brinstar_top_bg1.set(15, 5, 0x00AE, 0x0107)
-        brinstar_top_bg1.set(15, 6, 0x005F, 0x0117)
-        write_data(rombuffer, brinstar_top_bg1.to_compressed_data(), brinstar_top.bg1.rom_address())
-        write_data(rombuffer, brinstar_top_clipdata.to_compressed_data(), brinstar_top.clipdata.rom_address())
-
-    # Change the bomb block by the Brinstar under-bridge item to never reform
-    under_bridge = get_backgrounds(Area.BRINSTAR, 14)
-    under_bridge_clipdata = BackgroundTilemap.from_info(under_bridge.clipdata, 287)
-    under_bridge_clipdata.set(0xC, 0x17, Clipdata.BOMB_BLOCK_NEVER_REFORM, Clipdata.BOMB_BLOCK_REFORM)
-    write_data(rombuffer, under_bridge_clipdata.to_compressed_data(), under_bridge.clipdata.rom_address())
-
-    if "norfair_brinstar_elevator" in patches:
-        # Move the elevator to the bottom of the room
-        norfair_brinstar_elevator = get_backgrounds(Area.NORFAIR, 0)
-        norfair_brinstar_elevator_clipdata = BackgroundTilemap.from_info(norfair_brinstar_elevator.clipdata, 238)
-        norfair_brinstar_elevator_bg1 = BackgroundTilemap.from_info(norfair_brinstar_elevator.bg1, 504)
-        elevator_tiles = [[0x01D0, 0x01D1, 0x01D2, 0x01D3, 0x01D4],
-                          [0x01E0, 0x01E1, 0x01E2, 0x01E3, 0x01E4],
-                          [0x0000] * 5]
-        ground_tiles = [[0x0000] * 5,
-                        [0x009B, 0x006B, 0x009E, 0x009C, 0x009D],
-                        [0x00AB, 0x0000, 0x00AE, 0x00AC, 0x00AD]]
-        norfair_brinstar_elevator_clipdata.set(9, 16, Clipdata.SOLID, Clipdata.ELEVATOR_UP)
-        norfair_brinstar_elevator_clipdata.set(9, 29, Clipdata.ELEVATOR_UP, Clipdata.SOLID)
-        for x in (7, 11):
-            norfair_brinstar_elevator_clipdata.set(x, 26, Clipdata.AIR, Clipdata.SOLID)
-        for y, (elevator_row, ground_row) in enumerate(zip(elevator_tiles, ground_tiles)):
-            for x, (elevator_tile, ground_tile) in enumerate(zip(elevator_row, ground_row)):
-                norfair_brinstar_elevator_bg1.set(x + 7, y + 15, ground_tile, elevator_tile)
-                norfair_brinstar_elevator_bg1.set(x + 7, y + 28, elevator_tile, ground_tile)
-        new_sprites = b"".join([
-            SpriteData(28, 9, 4).pack(),  # Elevator
-            SpriteData(23, 6, 2).pack(),  # Ripper
-            SpriteData(23, 12, 2).pack(),  # Ripper
-            SpriteData.terminator().pack()
-        ])
-        write_data(rombuffer, norfair_brinstar_elevator_clipdata.to_compressed_data(), norfair_brinstar_elevator.clipdata.rom_address())
-        write_data(rombuffer, norfair_brinstar_elevator_bg1.to_compressed_data(), norfair_brinstar_elevator.bg1.rom_address())
-        write_data(rombuffer, new_sprites, norfair_brinstar_elevator.default_sprite_data_address)
-
-    # Add beam blocks to escape softlock
-    # Change visual to not leave floating dirt when breaking the blocks
-    crateria_near_plasma = get_backgrounds(Area.CRATERIA, 9)
-    crateria_near_plasma_clipdata = BackgroundTilemap.from_info(crateria_near_plasma.clipdata, 645)
-    crateria_near_plasma_bg1 = BackgroundTilemap.from_info(crateria_near_plasma.bg1, 1539)
-    for x in range(9, 12):
-        crateria_near_plasma_clipdata.set(x, 39, Clipdata.BEAM_BLOCK_NO_REFORM, Clipdata.SOLID)
-    crateria_near_plasma_bg1.set(10, 38, 0x0000, 0x0064)
-    crateria_near_plasma_bg1.set(10, 39, 0x0072, 0x0074)
-    write_data(rombuffer, crateria_near_plasma_clipdata.to_compressed_data(), crateria_near_plasma.clipdata.rom_address())
-    write_data(rombuffer, crateria_near_plasma_bg1.to_compressed_data(), crateria_near_plasma.bg1.rom_address())
-
-    if "crateria_water_speedway" in patches:
-        # Change speed booster blocks in watery room next to elevator to beam blocks
-        crateria_water_speedway = get_backgrounds(Area.CRATERIA, 11)
-        crateria_water_speedway_clipdata = BackgroundTilemap.from_info(crateria_water_speedway.clipdata, 151)
-        crateria_water_speedway_clipdata.set(0x11, 0xA,
-                                             Clipdata.LARGE_BEAM_BLOCK_NW_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
-        crateria_water_speedway_clipdata.set(0x12, 0xA,
-                                             Clipdata.LARGE_BEAM_BLOCK_NE_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
-        crateria_water_speedway_clipdata.set(0x11, 0xB,
-                                             Clipdata.LARGE_BEAM_BLOCK_SW_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
-        crateria_water_speedway_clipdata.set(0x12, 0xB,
-                                             Clipdata.LARGE_BEAM_BLOCK_SE_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
-        crateria_water_speedway_clipdata.set(0x13, 0xB,
-                                             Clipdata.BEAM_BLOCK_NO_REFORM,
-                                             Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
-        write_data(rombuffer, crateria_water_speedway_clipdata.to_compressed_data(),
-                   crateria_water_speedway.clipdata.rom_address())
-
-    # Change speed booster blocks in Kraid escape room to beam blocks
-    kraid_right_shaft = get_backgrounds(Area.KRAID, 27)
-    kraid_right_shaft_clipdata = BackgroundTilemap.from_info(kraid_right_shaft.clipdata, 520)
-    kraid_right_shaft_clipdata.set(0xA, 0x37,
-                                         Clipdata.LARGE_BEAM_BLOCK_NW_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
-    kraid_right_shaft_clipdata.set(0xB, 0x37,
-                                         Clipdata.LARGE_BEAM_BLOCK_NE_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
-    kraid_right_shaft_clipdata.set(0xA, 0x38,
-                                         Clipdata.LARGE_BEAM_BLOCK_SW_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
-    kraid_right_shaft_clipdata.set(0xB, 0x38,
-                                         Clipdata.LARGE_BEAM_BLOCK_SE_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
-    write_data(rombuffer, kraid_right_shaft_clipdata.to_compressed_data(), kraid_right_shaft.clipdata.rom_address())
-
-    # Change Ridley ballcannon room to allow escape from the bottom without needing the ballcannon
-    ridley_ballcannon = get_backgrounds(Area.RIDLEY, 23)
-    ridley_ballcannon_clipdata = BackgroundTilemap.from_info(ridley_ballcannon.clipdata, 186)
-    ridley_ballcannon_bg1 = BackgroundTilemap.from_info(ridley_ballcannon.bg1, 488)
-    for x in range(3, 5):
-        ridley_ballcannon_clipdata.set(x, 0xD, Clipdata.AIR, Clipdata.PITFALL_BLOCK)
-    ridley_ballcannon_bg1.set(3, 0xD, 0x0000, 0x00A6)
-    ridley_ballcannon_bg1.set(4, 0xD, 0x0000, 0x00A7)
-    ridley_ballcannon_clipdata.set(4, 0xF, Clipdata.PITFALL_BLOCK_SLOW, Clipdata.AIR)
-    ridley_ballcannon_bg1.set(4, 0xF, 0x00B9, 0x0000)
-    write_data(rombuffer, ridley_ballcannon_clipdata.to_compressed_data(), ridley_ballcannon.clipdata.rom_address())
-    write_data(rombuffer, ridley_ballcannon_bg1.to_compressed_data(), ridley_ballcannon.bg1.rom_address())
-
-    if "crateria_left_of_grip" in patches:
-        crateria_left_of_grip = get_backgrounds(Area.CRATERIA, 15)
-        crateria_left_of_grip_clipdata = BackgroundTilemap.from_info(crateria_left_of_grip.clipdata, 237)
-        crateria_left_of_grip_bg1 = BackgroundTilemap.from_info(crateria_left_of_grip.bg1, 515)
-        crateria_left_of_grip_clipdata.set(6, 0xD, Clipdata.BEAM_BLOCK_REFORM, Clipdata.SOLID)
-        crateria_left_of_grip_clipdata.set(7, 0xD, Clipdata.BEAM_BLOCK_REFORM, Clipdata.SOLID)
-        crateria_left_of_grip_bg1.set(6, 0xD, 0x0130, 0x00A9)
-        crateria_left_of_grip_bg1.set(7, 0xD, 0x0130, 0x00AA)
-        crateria_left_of_grip_bg1.set(6, 0xE, 0x00A9, 0x00B9)
-        crateria_left_of_grip_bg1.set(7, 0xE, 0x00AA, 0x00BA)
-        crateria_left_of_grip_bg1.set(6, 0xF, 0x00B9, 0x00C9)
-        crateria_left_of_grip_bg1.set(7, 0xF, 0x00BA, 0x00CA)
-        crateria_left_of_grip_bg1.set(6, 0x10, 0x00C9, 0x00D9)
-        crateria_left_of_grip_bg1.set(7, 0x10, 0x00CA, 0x00DA)
-        crateria_left_of_grip_bg1.set(6, 0x11, 0x00D9, 0x00E9)
-        crateria_left_of_grip_bg1.set(7, 0x11, 0x00DA, 0x00EA)
-        write_data(rombuffer, crateria_left_of_grip_clipdata.to_compressed_data(),
-                   crateria_left_of_grip.clipdata.rom_address())
-        write_data(rombuffer, crateria_left_of_grip_bg1.to_compressed_data(), crateria_left_of_grip.bg1.rom_address())
-
-    return bytes(rombuffer)
+def load_layout_patches() -> List[Dict]:
+    return json.loads(data_path("layout_patches.json").decode("utf-8"))
+
+
+layout_patches = load_layout_patches()
+
+# Patches that require expanded space. These are not backwards compatible, so we keep a list and
+# apply only the ones that both the generator and the patcher have.
+# Every patched tilemap keeps its hand-measured size limit. The base patch can give a tilemap more space than
+# the data originally there used, so the limits stay until check_size_limits has been run against a ROM.
+expansion_required_patches = {patch["name"] for patch in layout_patches if patch.get("expansion_required", False)}
+
+
+def compile_layout_patches(patches: Set[str]) -> CompiledLayoutPatches:
+    """
+    Collect the edits of every layout patch that applies, grouped by tilemap, so that each tilemap is
+    only decompressed and recompressed once. `patches` are the expansion-required patches to apply.
+    Every edit is checked against the tilemap as it was before any of them, so no two edits may change
+    the same tile. A size limit describes the space in the ROM, so patches of the same tilemap can't
+    disagree about it.
+    """
+    compiled = CompiledLayoutPatches({}, {})
+    edited: Dict[Tuple[Area, int, str], Set[Tuple[int, int]]] = {}
+    for patch in layout_patches:
+        if patch.get("expansion_required", False) and patch["name"] not in patches:
+            continue
+        for tilemap in patch["tilemaps"]:
+            key = (Area[tilemap["area"]], tilemap["room"], tilemap["layer"])
+            max_compressed_size, edits = compiled.tilemaps.get(key, (None, []))
+            if "max_compressed_size" in tilemap:
+                if max_compressed_size not in (None, tilemap["max_compressed_size"]):
+                    raise ValueError(f"Patches of {tilemap['area'].title()} {tilemap['room']} {tilemap['layer']} have "
+                                     f"different size limits ({max_compressed_size} and {tilemap['max_compressed_size']})")
+                max_compressed_size = tilemap["max_compressed_size"]
+            for x, y, tile, original_tile in tilemap["edits"]:
+                if (x, y) in edited.setdefault(key, set()):
+                    raise ValueError(f"Tile ({x}, {y}) of {tilemap['area'].title()} {tilemap['room']} "
+                                     f"{tilemap['layer']} is edited more than once")
+                edited[key].add((x, y))
+                edits.append(TileEdit(x, y, _tile_value(tile), _tile_value(original_tile)))
+            compiled.tilemaps[key] = TilemapPatch(max_compressed_size, edits)
+        for sprites in patch.get("sprites", ()):
+            key = (Area[sprites["area"]], sprites["room"])
+            if key in compiled.sprites:
+                raise ValueError(f"Sprites of {sprites['area'].title()} {sprites['room']} are replaced by more than one patch")
+            compiled.sprites[key] = [SpriteData(*sprite) for sprite in sprites["sprites"]]
+    return compiled
+
+
+def check_size_limits(rom: bytes) -> List[Tuple[Area, int, str]]:
+    """
+    Check the size limits of the background and layout patches against a ROM with the base patch applied.
+    A limit below the space its tilemap already takes can't be right, so that raises ValueError. Returns
+    the tilemaps whose limit is the same as the default one, which can be removed.
+    """
+    rooms = RoomIndex(rom)
+    limits = dict(background_patch_limits)
+    for key, (max_compressed_size, _) in compile_layout_patches(expansion_required_patches).tilemaps.items():
+        if max_compressed_size is not None:
+            limits[key] = max_compressed_size
+    errors = []
+    redundant = []
+    for (area, room, layer), limit in limits.items():
+        tilemap = BackgroundTilemap.from_info(getattr(rooms(area, room), layer))
+        if limit < tilemap.original_compressed_size:
+            errors.append(f"{area.name.title()} {room} {layer} (limit: {limit}, size: {tilemap.original_compressed_size})")
+        elif limit == tilemap.max_compressed_size:
+            redundant.append((area, room, layer))
+    if errors:
+        raise ValueError("Size limits are below the space their tilemap takes: " + "; ".join(errors))
+    return redundant
+
+
+def apply_layout_patches(rom: bytes, patches: Set[str], session: Optional[PatchSession] = None) -> bytes:
+    if session is None:
+        session = PatchSession()
+    rombuffer = session.begin(rom)
+    get_backgrounds = session.rooms
+    compiled = compile_layout_patches(patches)
+
+    for (area, room, layer), (max_compressed_size, edits) in compiled.tilemaps.items():
+        info = getattr(get_backgrounds(area, room), layer)
+        tilemap = session.tilemap(info, max_compressed_size)
+        tilemap.apply_edits(edits)
+        session.write_tilemap(tilemap, info)
+
+    for (area, room), sprites in compiled.sprites.items():
+        sprite_data = b"".join(sprite.pack() for sprite in (*sprites, SpriteData.terminator()))
+        write_data(rombuffer, sprite_data, get_backgrounds(area, room).default_sprite_data_address)
+
+    return session.end()
@@ -0,0 +1,197 @@
+"""
+Codec benchmarks against the assets in a real ROM. These are not run as part of the test suite.
+Run from the Archipelago directory with the path to a Metroid: Zero Mission (U) ROM:
+
+    python -m worlds.mzm.test.benchmarks "Metroid - Zero Mission (USA).gba" --json results.json
+"""
+import argparse
+import json
+import platform
+import timeit
+from typing import Callable, Dict, Iterator, List, NamedTuple, Tuple
+
+import bsdiff4
+
+from .. import data, lz10, rle
+from ..data import data_path, get_rom_address
+from ..rom_data import Area, BackgroundProperties, ByteString, RoomIndex
+from .reference import lz10 as reference_lz10
+
+
+# Compressed graphics that are decoded while patching
+item_graphics = (
+    "sChozoStatueLongBeamGfx",
+    "sChargeBeamGfx",
+    "sChozoStatueIceBeamGfx",
+    "sChozoStatueWaveBeamGfx",
+    "sChozoStatueBombsGfx",
+    "sChozoStatueVariaGfx",
+    "sMorphBallGfx",
+    "sChozoStatueSpeedboosterGfx",
+    "sChozoStatueHighJumpGfx",
+    "sChozoStatueScrewAttackGfx",
+    "sPowerGripGfx",
+    "sChozoStatuePlasmaBeamGfx",
+    "sChozoStatueGravitySuitGfx",
+    "sChozoStatueSpaceJumpGfx",
+)
+
+
+def load_rom(path: str) -> bytes:
+    """Read a vanilla ROM and apply the base patch, so that symbol addresses line up."""
+    with open(path, "rb") as stream:
+        rom = stream.read()
+    return bsdiff4.patch(rom, data_path("basepatch.bsdiff"))
+
+
+def benchmark_lz10_decompress(rom: bytes, number: int = 20):
+    print(f"{'Asset':32} {'Size':>6} {'Reference':>12} {'Current':>12} {'Speedup':>8}")
+    total_reference = total_current = 0
+    for symbol in item_graphics:
+        compressed = memoryview(rom)[get_rom_address(symbol):]
+        size = int.from_bytes(compressed[1:4], "little")
+        expected = reference_lz10.decompress_raw_lzss10(compressed[4:], size)
+        if lz10.decompress(compressed) != expected:
+            raise AssertionError(f"{symbol} decompressed differently")
+
+        reference = timeit.timeit(lambda: reference_lz10.decompress_raw_lzss10(compressed[4:], size), number=number)
+        current = timeit.timeit(lambda: lz10.decompress(compressed), number=number)
+        total_reference += reference
+        total_current += current
+        print(f"{symbol:32} {size:6} {1000 * reference / number:9.3f} ms {1000 * current / number:9.3f} ms "
+              f"{reference / current:7.1f}x")
+    print(f"{'Total':39} {1000 * total_reference / number:9.3f} ms {1000 * total_current / number:9.3f} ms "
+          f"{total_reference / total_current:7.1f}x")
+
+
+class Asset(NamedTuple):
+    name: str
+    codec: str
+    address: int
+    compressed: memoryview  # Starts at the codec's data, runs to the end of the ROM
+
+
+def tilemap_assets(rom: bytes) -> Iterator[Asset]:
+    """Every distinct background and clipdata tilemap referenced by a room."""
+    room_index = RoomIndex(rom)
+    seen = set()
+    for area in Area:
+        for room, room_info in room_index.rooms(area):
+            for layer in ("bg0", "bg1", "bg2", "bg3", "clipdata"):
+                info = getattr(room_info, layer)
+                address = info.rom_address()
+                if address in seen:
+                    continue
+                name = f"{area.name.lower()} {room} {layer}"
+                if info.properties & BackgroundProperties.RLE_COMPRESSED:
+                    seen.add(address)
+                    yield Asset(name, "rle", address, info.compressed_data()[2:])
+                elif info.properties & BackgroundProperties.LZ77_COMPRESSED:
+                    seen.add(address)
+                    yield Asset(name, "lz10", address, info.compressed_data()[4:])
+
+
+def graphics_assets(rom: bytes) -> Iterator[Asset]:
+    """Every *Gfx symbol that holds LZ77-compressed data. Uncompressed graphics are skipped."""
+    for symbol in sorted(data.rom_symbols):
+        if not symbol.endswith("Gfx"):
+            continue
+        address = get_rom_address(symbol)
+        compressed = memoryview(rom)[address:]
+        if compressed[0] != 0x10:
+            continue
+        try:
+            lz10.decompress(compressed)
+        except lz10.DecompressionError:
+            continue
+        yield Asset(symbol, "lz10", address, compressed)
+
+
+Codec = Tuple[Callable[[ByteString], Tuple[bytearray, int]], Callable[[bytearray], bytes]]
+codecs: Dict[str, Codec] = {
+    "lz10": (lz10.decompress_with_footprint, lz10.compress),
+    "rle": (rle.decompress_with_footprint, rle.compress),
+}
+
+
+def benchmark_asset(asset: Asset, number: int) -> Dict:
+    decode, encode = codecs[asset.codec]
+    decoded, vanilla_size = decode(asset.compressed)
+    if asset.codec == "lz10":
+        # The footprint doesn't include the padding, which the encoder always adds
+        vanilla_size = (vanilla_size + 3) & ~3
+    encoded = encode(decoded)
+    decode_time = timeit.timeit(lambda: decode(asset.compressed), number=number) / number
+    encode_time = timeit.timeit(lambda: encode(decoded), number=number) / number
+    return {
+        "name": asset.name,
+        "codec": asset.codec,
+        "address": asset.address,
+        "decoded_size": len(decoded),
+        "vanilla_size": vanilla_size,
+        "encoded_size": len(encoded),
+        "ratio": len(encoded) / vanilla_size,
+        "decode_seconds": decode_time,
+        "encode_seconds": encode_time,
+        "round_trip": decode(encoded)[0] == decoded,
+    }
+
+
+def summarize(results: List[Dict]) -> Dict:
+    decoded = sum(result["decoded_size"] for result in results)
+    return {
+        "assets": len(results),
+        "decoded_bytes": decoded,
+        "vanilla_bytes": sum(result["vanilla_size"] for result in results),
+        "encoded_bytes": sum(result["encoded_size"] for result in results),
+        "ratio": sum(result["encoded_size"] for result in results) / sum(result["vanilla_size"] for result in results),
+        "decode_mb_per_second": decoded / sum(result["decode_seconds"] for result in results) / 1e6,
+        "encode_mb_per_second": decoded / sum(result["encode_seconds"] for result in results) / 1e6,
+        "round_trip": all(result["round_trip"] for result in results),
+    }
+
+
+def benchmark_corpus(rom: bytes, number: int = 3) -> Dict:
+    """Measure both codecs on every tilemap and compressed graphic in the ROM."""
+    results = [benchmark_asset(asset, number) for asset in (*tilemap_assets(rom), *graphics_assets(rom))]
+    summaries = {}
+    print(f"{'Codec':6} {'Assets':>6} {'Decoded':>9} {'Decode':>11} {'Encode':>11} {'Ratio':>7} Round trip")
+    for codec in codecs:
+        codec_results = [result for result in results if result["codec"] == codec]
+        if not codec_results:
+            continue
+        summary = summaries[codec] = summarize(codec_results)
+        print(f"{codec:6} {summary['assets']:6} {summary['decoded_bytes']:9} "
+              f"{summary['decode_mb_per_second']:6.2f} MB/s {summary['encode_mb_per_second']:6.2f} MB/s "
+              f"{summary['ratio']:7.3f} {'ok' if summary['round_trip'] else 'FAILED'}")
+    for result in results:
+        if not result["round_trip"]:
+            print(f"Round trip failed: {result['name']} ({result['codec']}, {result['address']:07x})")
+    return {
+        "symbols_hash": data.symbols_hash,
+        "python": platform.python_version(),
+        "numpy": lz10.numpy.__version__ if lz10.numpy is not None else None,
+        "number": number,
+        "codecs": summaries,
+        "assets": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("rom", help="Path to a vanilla Metroid: Zero Mission (U) ROM")
+    parser.add_argument("-n", "--number", type=int, default=20, help="Number of runs per item graphic")
+    parser.add_argument("--corpus-number", type=int, default=3, help="Number of runs per asset in the full corpus")
+    parser.add_argument("--json", metavar="PATH", help="Write the corpus results to this file")
+    args = parser.parse_args()
+    rom = load_rom(args.rom)
+    benchmark_lz10_decompress(rom, args.number)
+    print()
+    results = benchmark_corpus(rom, args.corpus_number)
+    if args.json is not None:
+        with open(args.json, "w") as stream:
+            json.dump(results, stream, indent=2)
+
+
+if __name__ == "__main__":
+    main()
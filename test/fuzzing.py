@@ -0,0 +1,126 @@
+"""
+Differential fuzzing of the codecs against the original implementations in the reference package.
+test_fuzzing runs a fixed set of cases as part of the test suite. For a longer run that also reports
+how much faster the current codecs are, run from the Archipelago directory:
+
+    python -m worlds.mzm.test.fuzzing --count 500 --json fuzzing.json
+"""
+import argparse
+import json
+import random
+import time
+from typing import Callable, Dict, Iterator, Tuple
+
+from .. import lz10, rle
+from .reference import lz10 as reference_lz10, rle as reference_rle
+
+
+def random_bytes(rng: random.Random, length: int, alphabet: int = 256) -> bytes:
+    return bytes(rng.randrange(alphabet) for _ in range(length))
+
+
+def long_runs(rng: random.Random) -> bytes:
+    """Runs longer than the longest lz10 match and the longest 1-byte RLE run."""
+    return b"".join(bytes((rng.randrange(4),)) * rng.choice((1, 2, 17, 18, 19, 127, 128, 300))
+                    for _ in range(rng.randrange(1, 40)))
+
+
+def periodic(rng: random.Random) -> bytes:
+    """A block repeated at a period around the size of the lz10 window."""
+    period = rng.choice((4095, 4096, 4097))
+    block = random_bytes(rng, period)
+    return (block * 3)[:period * 2 + rng.randrange(1, 100)]
+
+
+def maximal_displacements(rng: random.Random) -> bytes:
+    """Matches that are only in reach at the largest displacements."""
+    head = random_bytes(rng, rng.randrange(3, 19))
+    gap = random_bytes(rng, 4096 - len(head) + rng.randrange(-2, 3))
+    return head + gap + head + random_bytes(rng, rng.randrange(10))
+
+
+def tilemap_like(rng: random.Random) -> bytes:
+    """Halfwords with a few tile values and a mostly empty high byte, like clipdata."""
+    tiles = [rng.randrange(0x80) for _ in range(rng.randrange(1, 6))]
+    return b"".join(rng.choice(tiles).to_bytes(2, "little") for _ in range(rng.randrange(2, 3000)))
+
+
+generators: Dict[str, Callable[[random.Random], bytes]] = {
+    "random": lambda rng: random_bytes(rng, rng.randrange(1, 3000)),
+    "small alphabet": lambda rng: random_bytes(rng, rng.randrange(1, 3000), rng.randrange(1, 5)),
+    "odd length": lambda rng: random_bytes(rng, 2 * rng.randrange(1, 1000) + 1, 3),
+    "long runs": long_runs,
+    "periodic": periodic,
+    "maximal displacements": maximal_displacements,
+    "tilemap": tilemap_like,
+}
+
+
+def fuzz_inputs(seed: int, count: int) -> Iterator[Tuple[str, bytes]]:
+    rng = random.Random(seed)
+    kinds = list(generators)
+    for i in range(count):
+        kind = kinds[i % len(kinds)]
+        yield kind, generators[kind](rng)
+
+
+def _timed(function: Callable, *args) -> Tuple[bytes, float]:
+    start = time.perf_counter()
+    result = function(*args)
+    return bytes(result), time.perf_counter() - start
+
+
+class Timings:
+    def __init__(self):
+        self.totals: Dict[str, Dict[str, float]] = {}
+
+    def compare(self, operation: str, reference: Callable, current: Callable, *args) -> bytes:
+        """Run an operation with both implementations and check that they agree."""
+        expected, reference_time = _timed(reference, *args)
+        actual, current_time = _timed(current, *args)
+        if actual != expected:
+            raise AssertionError(f"{operation} differs from the reference")
+        totals = self.totals.setdefault(operation, {"reference": 0.0, "current": 0.0})
+        totals["reference"] += reference_time
+        totals["current"] += current_time
+        return expected
+
+    def ratios(self) -> Dict[str, Dict[str, float]]:
+        return {operation: dict(totals, speedup=totals["reference"] / totals["current"])
+                for operation, totals in self.totals.items()}
+
+
+def check(data: bytes, timings: Timings):
+    compressed = timings.compare("lz10.compress", reference_lz10.compress, lz10.compress, bytearray(data))
+    timings.compare("lz10.decompress", reference_lz10.decompress, lz10.decompress, compressed)
+    # The original RLE codec only handles whole halfwords, and at least two of them
+    if len(data) % 2 == 0 and len(data) >= 4:
+        compressed = timings.compare("rle.compress", reference_rle.compress, rle.compress, data)
+        timings.compare("rle.decompress", reference_rle.decompress, rle.decompress, compressed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--count", type=int, default=200, help="Number of inputs to try")
+    parser.add_argument("--json", metavar="PATH", help="Write the timings to this file")
+    args = parser.parse_args()
+
+    timings = Timings()
+    for i, (kind, data) in enumerate(fuzz_inputs(args.seed, args.count)):
+        try:
+            check(data, timings)
+        except AssertionError as error:
+            raise AssertionError(f"Input {i} ({kind}, {len(data)} bytes, seed {args.seed}): {error}") from None
+
+    ratios = timings.ratios()
+    print(f"{'Operation':16} {'Reference':>11} {'Current':>11} {'Speedup':>8}")
+    for operation, ratio in ratios.items():
+        print(f"{operation:16} {ratio['reference']:9.3f} s {ratio['current']:9.3f} s {ratio['speedup']:7.1f}x")
+    if args.json is not None:
+        with open(args.json, "w") as stream:
+            json.dump({"seed": args.seed, "count": args.count, "operations": ratios}, stream, indent=2)
+
+
+if __name__ == "__main__":
+    main()
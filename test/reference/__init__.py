@@ -0,0 +1,4 @@
+"""
+The original pure-Python codecs and layout patches, kept unchanged so that faster implementations and
+the patch data can be checked against them. Any difference in their output would change patched ROMs.
+"""
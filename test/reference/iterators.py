@@ -1,3 +1,4 @@
+# Unmodified copy of the original iterators.py. See __init__.py.
 import itertools
 
 
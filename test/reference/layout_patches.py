@@ -0,0 +1,145 @@
+# Unmodified copy of apply_layout_patches from the original rom_data.py. See __init__.py.
+from typing import Set
+
+from ...rom_data import Area, BackgroundTilemap, Clipdata, SpriteData, background_extraction_function, write_data
+
+
+def apply_layout_patches(rom: bytes, patches: Set[str]) -> bytes:
+    rom = memoryview(rom)
+    rombuffer = bytearray(rom)
+    get_backgrounds = background_extraction_function(rom)
+
+    # Change the three beam blocks to never reform
+    long_beam_hall = get_backgrounds(Area.BRINSTAR, 4)
+    long_beam_hall_clipdata = BackgroundTilemap.from_info(long_beam_hall.clipdata, 142)
+    for x in range(29, 32):
+        long_beam_hall_clipdata.set(x, 8, Clipdata.BEAM_BLOCK_NEVER_REFORM, Clipdata.BEAM_BLOCK_NO_REFORM)
+    write_data(rombuffer, long_beam_hall_clipdata.to_compressed_data(), long_beam_hall.clipdata.rom_address())
+
+    if "brinstar_top" in patches:
+        # Create a slope instead of a wall to allow leaving Brinstar Top Missile room
+        brinstar_top = get_backgrounds(Area.BRINSTAR, 29)
+        brinstar_top_clipdata = BackgroundTilemap.from_info(brinstar_top.clipdata, 117)
+        brinstar_top_bg1 = BackgroundTilemap.from_info(brinstar_top.bg1, 287)
+        brinstar_top_clipdata.set(14, 5, Clipdata.STEEP_SLOPE_RISING, Clipdata.AIR)
+        brinstar_top_bg1.set(14, 5, 0x009E, 0x0106)
+        brinstar_top_bg1.set(14, 6, 0x00AE, 0x0116)
+        brinstar_top_clipdata.set(15, 4, Clipdata.STEEP_SLOPE_RISING, Clipdata.SOLID)
+        brinstar_top_bg1.set(15, 4, 0x009E, 0x0092)
+        brinstar_top_bg1.set(15, 5, 0x00AE, 0x0107)
+        brinstar_top_bg1.set(15, 6, 0x005F, 0x0117)
+        write_data(rombuffer, brinstar_top_bg1.to_compressed_data(), brinstar_top.bg1.rom_address())
+        write_data(rombuffer, brinstar_top_clipdata.to_compressed_data(), brinstar_top.clipdata.rom_address())
+
+    # Change the bomb block by the Brinstar under-bridge item to never reform
+    under_bridge = get_backgrounds(Area.BRINSTAR, 14)
+    under_bridge_clipdata = BackgroundTilemap.from_info(under_bridge.clipdata, 287)
+    under_bridge_clipdata.set(0xC, 0x17, Clipdata.BOMB_BLOCK_NEVER_REFORM, Clipdata.BOMB_BLOCK_REFORM)
+    write_data(rombuffer, under_bridge_clipdata.to_compressed_data(), under_bridge.clipdata.rom_address())
+
+    if "norfair_brinstar_elevator" in patches:
+        # Move the elevator to the bottom of the room
+        norfair_brinstar_elevator = get_backgrounds(Area.NORFAIR, 0)
+        norfair_brinstar_elevator_clipdata = BackgroundTilemap.from_info(norfair_brinstar_elevator.clipdata, 238)
+        norfair_brinstar_elevator_bg1 = BackgroundTilemap.from_info(norfair_brinstar_elevator.bg1, 504)
+        elevator_tiles = [[0x01D0, 0x01D1, 0x01D2, 0x01D3, 0x01D4],
+                          [0x01E0, 0x01E1, 0x01E2, 0x01E3, 0x01E4],
+                          [0x0000] * 5]
+        ground_tiles = [[0x0000] * 5,
+                        [0x009B, 0x006B, 0x009E, 0x009C, 0x009D],
+                        [0x00AB, 0x0000, 0x00AE, 0x00AC, 0x00AD]]
+        norfair_brinstar_elevator_clipdata.set(9, 16, Clipdata.SOLID, Clipdata.ELEVATOR_UP)
+        norfair_brinstar_elevator_clipdata.set(9, 29, Clipdata.ELEVATOR_UP, Clipdata.SOLID)
+        for x in (7, 11):
+            norfair_brinstar_elevator_clipdata.set(x, 26, Clipdata.AIR, Clipdata.SOLID)
+        for y, (elevator_row, ground_row) in enumerate(zip(elevator_tiles, ground_tiles)):
+            for x, (elevator_tile, ground_tile) in enumerate(zip(elevator_row, ground_row)):
+                norfair_brinstar_elevator_bg1.set(x + 7, y + 15, ground_tile, elevator_tile)
+                norfair_brinstar_elevator_bg1.set(x + 7, y + 28, elevator_tile, ground_tile)
+        new_sprites = b"".join([
+            SpriteData(28, 9, 4).pack(),  # Elevator
+            SpriteData(23, 6, 2).pack(),  # Ripper
+            SpriteData(23, 12, 2).pack(),  # Ripper
+            SpriteData.terminator().pack()
+        ])
+        write_data(rombuffer, norfair_brinstar_elevator_clipdata.to_compressed_data(), norfair_brinstar_elevator.clipdata.rom_address())
+        write_data(rombuffer, norfair_brinstar_elevator_bg1.to_compressed_data(), norfair_brinstar_elevator.bg1.rom_address())
+        write_data(rombuffer, new_sprites, norfair_brinstar_elevator.default_sprite_data_address)
+
+    # Add beam blocks to escape softlock
+    # Change visual to not leave floating dirt when breaking the blocks
+    crateria_near_plasma = get_backgrounds(Area.CRATERIA, 9)
+    crateria_near_plasma_clipdata = BackgroundTilemap.from_info(crateria_near_plasma.clipdata, 645)
+    crateria_near_plasma_bg1 = BackgroundTilemap.from_info(crateria_near_plasma.bg1, 1539)
+    for x in range(9, 12):
+        crateria_near_plasma_clipdata.set(x, 39, Clipdata.BEAM_BLOCK_NO_REFORM, Clipdata.SOLID)
+    crateria_near_plasma_bg1.set(10, 38, 0x0000, 0x0064)
+    crateria_near_plasma_bg1.set(10, 39, 0x0072, 0x0074)
+    write_data(rombuffer, crateria_near_plasma_clipdata.to_compressed_data(), crateria_near_plasma.clipdata.rom_address())
+    write_data(rombuffer, crateria_near_plasma_bg1.to_compressed_data(), crateria_near_plasma.bg1.rom_address())
+
+    if "crateria_water_speedway" in patches:
+        # Change speed booster blocks in watery room next to elevator to beam blocks
+        crateria_water_speedway = get_backgrounds(Area.CRATERIA, 11)
+        crateria_water_speedway_clipdata = BackgroundTilemap.from_info(crateria_water_speedway.clipdata, 151)
+        crateria_water_speedway_clipdata.set(0x11, 0xA,
+                                             Clipdata.LARGE_BEAM_BLOCK_NW_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
+        crateria_water_speedway_clipdata.set(0x12, 0xA,
+                                             Clipdata.LARGE_BEAM_BLOCK_NE_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
+        crateria_water_speedway_clipdata.set(0x11, 0xB,
+                                             Clipdata.LARGE_BEAM_BLOCK_SW_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
+        crateria_water_speedway_clipdata.set(0x12, 0xB,
+                                             Clipdata.LARGE_BEAM_BLOCK_SE_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
+        crateria_water_speedway_clipdata.set(0x13, 0xB,
+                                             Clipdata.BEAM_BLOCK_NO_REFORM,
+                                             Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
+        write_data(rombuffer, crateria_water_speedway_clipdata.to_compressed_data(),
+                   crateria_water_speedway.clipdata.rom_address())
+
+    # Change speed booster blocks in Kraid escape room to beam blocks
+    kraid_right_shaft = get_backgrounds(Area.KRAID, 27)
+    kraid_right_shaft_clipdata = BackgroundTilemap.from_info(kraid_right_shaft.clipdata, 520)
+    kraid_right_shaft_clipdata.set(0xA, 0x37,
+                                         Clipdata.LARGE_BEAM_BLOCK_NW_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
+    kraid_right_shaft_clipdata.set(0xB, 0x37,
+                                         Clipdata.LARGE_BEAM_BLOCK_NE_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
+    kraid_right_shaft_clipdata.set(0xA, 0x38,
+                                         Clipdata.LARGE_BEAM_BLOCK_SW_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
+    kraid_right_shaft_clipdata.set(0xB, 0x38,
+                                         Clipdata.LARGE_BEAM_BLOCK_SE_NO_REFORM, Clipdata.SPEED_BOOSTER_BLOCK_NO_REFORM)
+    write_data(rombuffer, kraid_right_shaft_clipdata.to_compressed_data(), kraid_right_shaft.clipdata.rom_address())
+
+    # Change Ridley ballcannon room to allow escape from the bottom without needing the ballcannon
+    ridley_ballcannon = get_backgrounds(Area.RIDLEY, 23)
+    ridley_ballcannon_clipdata = BackgroundTilemap.from_info(ridley_ballcannon.clipdata, 186)
+    ridley_ballcannon_bg1 = BackgroundTilemap.from_info(ridley_ballcannon.bg1, 488)
+    for x in range(3, 5):
+        ridley_ballcannon_clipdata.set(x, 0xD, Clipdata.AIR, Clipdata.PITFALL_BLOCK)
+    ridley_ballcannon_bg1.set(3, 0xD, 0x0000, 0x00A6)
+    ridley_ballcannon_bg1.set(4, 0xD, 0x0000, 0x00A7)
+    ridley_ballcannon_clipdata.set(4, 0xF, Clipdata.PITFALL_BLOCK_SLOW, Clipdata.AIR)
+    ridley_ballcannon_bg1.set(4, 0xF, 0x00B9, 0x0000)
+    write_data(rombuffer, ridley_ballcannon_clipdata.to_compressed_data(), ridley_ballcannon.clipdata.rom_address())
+    write_data(rombuffer, ridley_ballcannon_bg1.to_compressed_data(), ridley_ballcannon.bg1.rom_address())
+
+    if "crateria_left_of_grip" in patches:
+        crateria_left_of_grip = get_backgrounds(Area.CRATERIA, 15)
+        crateria_left_of_grip_clipdata = BackgroundTilemap.from_info(crateria_left_of_grip.clipdata, 237)
+        crateria_left_of_grip_bg1 = BackgroundTilemap.from_info(crateria_left_of_grip.bg1, 515)
+        crateria_left_of_grip_clipdata.set(6, 0xD, Clipdata.BEAM_BLOCK_REFORM, Clipdata.SOLID)
+        crateria_left_of_grip_clipdata.set(7, 0xD, Clipdata.BEAM_BLOCK_REFORM, Clipdata.SOLID)
+        crateria_left_of_grip_bg1.set(6, 0xD, 0x0130, 0x00A9)
+        crateria_left_of_grip_bg1.set(7, 0xD, 0x0130, 0x00AA)
+        crateria_left_of_grip_bg1.set(6, 0xE, 0x00A9, 0x00B9)
+        crateria_left_of_grip_bg1.set(7, 0xE, 0x00AA, 0x00BA)
+        crateria_left_of_grip_bg1.set(6, 0xF, 0x00B9, 0x00C9)
+        crateria_left_of_grip_bg1.set(7, 0xF, 0x00BA, 0x00CA)
+        crateria_left_of_grip_bg1.set(6, 0x10, 0x00C9, 0x00D9)
+        crateria_left_of_grip_bg1.set(7, 0x10, 0x00CA, 0x00DA)
+        crateria_left_of_grip_bg1.set(6, 0x11, 0x00D9, 0x00E9)
+        crateria_left_of_grip_bg1.set(7, 0x11, 0x00DA, 0x00EA)
+        write_data(rombuffer, crateria_left_of_grip_clipdata.to_compressed_data(),
+                   crateria_left_of_grip.clipdata.rom_address())
+        write_data(rombuffer, crateria_left_of_grip_bg1.to_compressed_data(), crateria_left_of_grip.bg1.rom_address())
+
+    return bytes(rombuffer)
@@ -0,0 +1,187 @@
+import random
+import tempfile
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+
+from .. import compression_cache, lz10, rle
+from ..compression_cache import CompressionCache
+
+
+def sample_inputs():
+    rng = random.Random(0)
+    yield b"abc"
+    yield bytes(5000)
+    yield bytes(range(256)) * 20
+    yield bytes(rng.randrange(4) for _ in range(5000))
+    block = bytes(rng.randrange(256) for _ in range(4096))
+    yield block + block + block[:100]
+
+
+class TestLZ10(TestCase):
+    def test_hash_chain_matches_sliding_window(self):
+        """Ensure the hash chain match finder produces the same parse as the reference window."""
+        for data in sample_inputs():
+            with self.subTest(length=len(data)):
+                expected = list(lz10._compress(data, lz10.SlidingWindow))
+                self.assertEqual(expected, list(lz10._compress(data, lz10.HashChainWindow)))
+
+    @skipIf(lz10.numpy is None, "NumPy is not installed")
+    def test_vectorized_search_matches_python(self):
+        class VectorizedWindow(lz10.HashChainWindow):
+            vectorize_min = 1
+
+        class VectorizedNearestWindow(lz10.NearestMatchWindow):
+            vectorize_min = 1
+
+        class PythonNearestWindow(lz10.NearestMatchWindow):
+            vectorize_min = None
+
+        for data in sample_inputs():
+            with self.subTest(length=len(data)):
+                self.assertEqual(list(lz10._compress(data, lz10.SlidingWindow)),
+                                 list(lz10._compress(data, VectorizedWindow)))
+                self.assertEqual(list(lz10._compress_optimal(data, PythonNearestWindow)),
+                                 list(lz10._compress_optimal(data, VectorizedNearestWindow)))
+
+    def test_round_trip(self):
+        for data in sample_inputs():
+            with self.subTest(length=len(data)):
+                self.assertEqual(data, bytes(lz10.decompress(lz10.compress(bytearray(data)))))
+
+    def test_optimal_round_trip(self):
+        for data in sample_inputs():
+            with self.subTest(length=len(data)):
+                greedy = lz10.compress(bytearray(data))
+                optimal = lz10.compress(bytearray(data), lz10.OPTIMAL)
+                self.assertEqual(data, bytes(lz10.decompress(optimal)))
+                self.assertLessEqual(len(optimal), len(greedy))
+
+    def test_compressed_size(self):
+        for data in sample_inputs():
+            for level in (lz10.GREEDY, lz10.OPTIMAL):
+                with self.subTest(length=len(data), level=level):
+                    self.assertEqual(len(lz10.compress(bytearray(data), level)), lz10.compressed_size(data, level))
+
+    def test_footprint(self):
+        for data in sample_inputs():
+            with self.subTest(length=len(data)):
+                compressed = lz10.compress(bytearray(data))
+                unpadded = len(compressed) - compressed[-3:].count(0xFF)
+                decompressed, consumed = lz10.decompress_with_footprint(compressed + bytes(8))
+                self.assertEqual(data, bytes(decompressed))
+                self.assertLessEqual(unpadded, consumed)
+                self.assertLessEqual(consumed, len(compressed))
+
+    def test_decompress_into(self):
+        for data in sample_inputs():
+            with self.subTest(length=len(data)):
+                compressed = lz10.compress(bytearray(data))
+                buffer = bytearray(b"\xAA" * (len(data) + 8))
+                consumed = lz10.decompress_into(compressed, buffer, 4)
+                self.assertEqual(lz10.decompress_with_footprint(compressed)[1], consumed)
+                self.assertEqual(b"\xAA" * 4 + data + b"\xAA" * 4, buffer)
+                self.assertEqual(data, b"".join(lz10.iter_decompress(compressed, 100)))
+                with self.assertRaises(ValueError):
+                    lz10.decompress_into(compressed, bytearray(len(data) - 1))
+
+    def test_incremental_matches_full_compression(self):
+        """Ensure reusing the greedy parse of the original data gives the same result as compressing from scratch."""
+        for data in sample_inputs():
+            tokens = lz10.read_tokens(lz10.compress(bytearray(data)))
+            for start in (0, len(data) // 2, len(data) - 1):
+                with self.subTest(length=len(data), start=start):
+                    edited = bytearray(data)
+                    edited[start] ^= 0xFF
+                    self.assertEqual(lz10.compress(edited), lz10.compress_incremental(edited, tokens, start))
+
+    def test_tokens(self):
+        for data in sample_inputs():
+            with self.subTest(length=len(data)):
+                tokens = lz10.tokenize(data)
+                self.assertEqual(len(data), sum(map(lz10.token_length, tokens)))
+                compressed = lz10.encode_tokens(tokens)
+                self.assertEqual(lz10.compress(bytearray(data)), compressed)
+                self.assertEqual(tokens, lz10.read_tokens(compressed))
+                unpadded = lz10.encode_tokens(tokens, padding=1)
+                self.assertEqual(lz10.encoded_size(tokens, padding=1), len(unpadded))
+                self.assertEqual(data, bytes(lz10.decompress(unpadded)))
+
+
+def halfword_inputs():
+    return (data for data in sample_inputs() if len(data) % 2 == 0)
+
+
+class TestRLE(TestCase):
+    def test_compressed_size(self):
+        for data in halfword_inputs():
+            with self.subTest(length=len(data)):
+                self.assertEqual(len(rle.compress(data)), rle.compressed_size(data))
+
+    def test_footprint(self):
+        for data in halfword_inputs():
+            with self.subTest(length=len(data)):
+                compressed = rle.compress(data)
+                self.assertEqual((data, len(compressed)), rle.decompress_with_footprint(compressed + bytes(8)))
+
+    def test_run_index(self):
+        rng = random.Random(0)
+        for data in halfword_inputs():
+            with self.subTest(length=len(data)):
+                compressed = rle.compress(data)
+                index = rle.RunIndex(compressed + bytes(8))
+                self.assertEqual((len(data) // 2, len(compressed)), (len(index), index.footprint))
+                self.assertEqual(data, index.read(0, len(index)))
+                for _ in range(20):
+                    start = rng.randrange(len(index))
+                    stop = rng.randrange(start, len(index) + 1)
+                    self.assertEqual(data[2 * start:2 * stop], index.read(start, stop))
+
+    @skipIf(rle.numpy is None, "NumPy is not installed")
+    def test_vectorized_run_lengths_match_python(self):
+        numpy = rle.numpy
+        for data in sample_inputs():
+            with self.subTest(length=len(data)):
+                expected = rle._run_lengths(data)
+                try:
+                    rle.numpy = None
+                    self.assertEqual(expected, rle._run_lengths(data))
+                finally:
+                    rle.numpy = numpy
+
+
+class TestCompressionCache(TestCase):
+    def test_memoize(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = CompressionCache(maxsize=2, directory=directory)
+            calls = []
+
+            def compute(data):
+                calls.append(data)
+                return rle.compress(data)
+
+            for data in (b"\0\0" * 8, b"\1\0" * 8, b"\2\0" * 8, b"\0\0" * 8):
+                self.assertEqual(rle.compress(data), cache.memoize("rle", (), (data,), lambda: compute(data)))
+            self.assertEqual(3, len(calls), "Cached data was compressed again")
+            self.assertEqual(2, len(cache.entries))
+
+            # A fresh cache reads the same entries back from disk
+            cache = CompressionCache(directory=directory)
+            self.assertEqual(rle.compress(b"\1\0" * 8), cache.memoize("rle", (), (b"\1\0" * 8,), lambda: b""))
+
+    def test_lz10_tokenize(self):
+        with patch.object(compression_cache, "cache", CompressionCache()):
+            for data in sample_inputs():
+                with self.subTest(length=len(data)):
+                    expected = lz10.tokenize(data)
+                    self.assertEqual(expected, compression_cache.lz10_tokenize(data))
+                    with patch.object(lz10, "tokenize", side_effect=AssertionError("Cached data was parsed again")):
+                        self.assertEqual(expected, compression_cache.lz10_tokenize(data))
+
+    def test_disk_store_is_opt_in(self):
+        self.assertIsNone(CompressionCache().directory)
+
+    def test_key_depends_on_codec_version(self):
+        key = CompressionCache.key("rle", (), (b"\0\0",))
+        with patch.object(compression_cache, "CACHE_VERSION", "other"):
+            self.assertNotEqual(key, CompressionCache.key("rle", (), (b"\0\0",)))
+        self.assertEqual(compression_cache.source_digest(lz10, rle), compression_cache.CACHE_VERSION)
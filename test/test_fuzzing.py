@@ -0,0 +1,12 @@
+from unittest import TestCase
+
+from .fuzzing import Timings, check, fuzz_inputs
+
+
+class TestDifferentialFuzzing(TestCase):
+    def test_codecs_match_reference(self):
+        """Ensure the codecs give exactly the same output as the original implementations."""
+        timings = Timings()
+        for i, (kind, data) in enumerate(fuzz_inputs(seed=0, count=42)):
+            with self.subTest(i=i, kind=kind, length=len(data)):
+                check(data, timings)
@@ -0,0 +1,138 @@
+from types import SimpleNamespace
+from unittest import TestCase, addModuleCleanup
+from unittest.mock import patch
+
+from worlds.Files import APProcedurePatch
+
+from .. import compression_cache, data, patch_deltas, rom_data
+from ..compression_cache import CompressionCache
+from ..patch_deltas import BACKGROUND, LAYOUT, DeltaSet, PatchDeltas, compute_patch_deltas, inputs_digest
+from ..rom import MZMPatchExtensions, MZMProcedurePatch
+
+
+def setUpModule():
+    # Keep what the tests compress out of the shared cache, whether or not its disk store is on
+    cache = patch.object(compression_cache, "cache", CompressionCache())
+    cache.start()
+    addModuleCleanup(cache.stop)
+
+
+def edit(rom: bytes, address: int, replacement: bytes) -> bytes:
+    return rom[:address] + replacement + rom[address + len(replacement):]
+
+
+def background_patches(rom: bytes) -> bytes:
+    return edit(rom, 0x100, b"back")
+
+
+def layout_patches(rom: bytes, patches) -> bytes:
+    rom = edit(rom, 0x200, b"layout")
+    if "a" in patches:
+        rom = edit(rom, 0x1000, b"patch a")
+    if "b" in patches:
+        rom = edit(rom, 0x2000, b"patch b")
+    return rom
+
+
+class TestPatchDeltas(TestCase):
+    def setUp(self):
+        self.rom = bytes(range(256)) * 64
+        after = bytearray(self.rom)
+        after[10:12] = b"ab"
+        after[15] = 0  # Close enough to the first change to share its range
+        after[0x3000:0x3004] = b"wxyz"
+        self.after = bytes(after)
+        self.deltas = PatchDeltas(data.symbols_hash, inputs_digest(), {"test": DeltaSet.difference(self.rom, self.after)})
+
+    def test_difference(self):
+        self.assertEqual([(10, b"ab\x0c\x0d\x0e\x00"), (0x3000, b"wxyz")], self.deltas.sets["test"].ranges)
+        self.assertEqual(self.after, self.deltas.apply(self.rom, ["test"]))
+
+    def test_round_trip(self):
+        self.assertEqual(self.deltas, PatchDeltas.from_bytes(self.deltas.to_bytes()))
+
+    def test_stale(self):
+        """Ensure deltas are refused when the bytes they replace aren't the ones they were made from."""
+        changed = bytearray(self.rom)
+        changed[0x3002] ^= 0xFF
+        self.assertIsNone(self.deltas.apply(bytes(changed), ["test"]))
+        self.assertIsNone(self.deltas.apply(self.rom, ["missing"]))
+        self.assertIsNone(self.deltas._replace(symbols_hash="0" * 32).apply(self.rom, ["test"]))
+
+    def test_stale_inputs(self):
+        """Ensure deltas are refused when the patch data they were made from changed."""
+        self.assertIsNone(self.deltas._replace(inputs_digest=bytes(16)).apply(self.rom, ["test"]))
+        with patch.object(rom_data, "item_clipdata_and_gfx", {}):
+            self.assertIsNone(self.deltas.apply(self.rom, ["test"]))
+        with patch.object(compression_cache, "source_digest", return_value="other"):
+            self.assertIsNone(self.deltas.apply(self.rom, ["test"]))
+
+
+@patch.object(rom_data, "expansion_required_patches", {"a", "b"})
+@patch.object(rom_data, "apply_layout_patches", layout_patches)
+@patch.object(rom_data, "apply_always_background_patches", background_patches)
+class TestComputePatchDeltas(TestCase):
+    def setUp(self):
+        self.rom = bytes(range(256)) * 64
+
+    def test_compute(self):
+        deltas = compute_patch_deltas(self.rom)
+        self.assertEqual({BACKGROUND, LAYOUT, "a", "b"}, set(deltas.sets))
+        background = background_patches(self.rom)
+        self.assertEqual(background, deltas.apply(self.rom, [BACKGROUND]))
+        for patches in ([], ["a"], ["b"], ["a", "b"]):
+            with self.subTest(patches=patches):
+                self.assertEqual(layout_patches(background, set(patches)), deltas.apply(background, [LAYOUT, *patches]))
+
+    def test_overlapping_patches(self):
+        def overlapping_layout_patches(rom: bytes, patches) -> bytes:
+            rom = layout_patches(rom, patches)
+            if "b" in patches:
+                rom = edit(rom, 0x1004, b"overlap")
+            return rom
+
+        with patch.object(rom_data, "apply_layout_patches", overlapping_layout_patches):
+            with self.assertRaises(ValueError):
+                compute_patch_deltas(self.rom)
+
+
+class TestPatchSteps(TestCase):
+    """Ensure the patch steps use the shipped deltas when they're valid, and fall back to patching otherwise."""
+
+    def setUp(self):
+        self.rom = bytes(range(256)) * 64
+        self.caller = SimpleNamespace(session=rom_data.PatchSession())
+        self.deltas = PatchDeltas(data.symbols_hash, inputs_digest(), {
+            LAYOUT: DeltaSet.difference(self.rom, layout_patches(self.rom, set())),
+            "a": DeltaSet.difference(layout_patches(self.rom, set()), layout_patches(self.rom, {"a"})),
+        })
+
+    def apply_layout_patches(self, deltas, patches) -> bytes:
+        with patch.object(patch_deltas, "load_patch_deltas", return_value=deltas):
+            return MZMPatchExtensions.apply_layout_patches(self.caller, self.rom, patches)
+
+    def test_uses_deltas(self):
+        with patch.object(rom_data, "apply_layout_patches", side_effect=AssertionError("Patched without the deltas")):
+            self.assertEqual(layout_patches(self.rom, {"a"}), self.apply_layout_patches(self.deltas, ["a"]))
+
+    def test_falls_back(self):
+        stale = self.deltas._replace(inputs_digest=bytes(16))
+        for deltas, patches in ((None, ["a"]), (stale, ["a"]), (self.deltas, ["a", "b"])):
+            with self.subTest(deltas=deltas is not None, patches=patches):
+                with patch.object(rom_data, "apply_layout_patches", return_value=b"patched") as apply_layout_patches:
+                    self.assertEqual(b"patched", self.apply_layout_patches(deltas, patches))
+                apply_layout_patches.assert_called_once_with(self.rom, set(patches), self.caller.session)
+
+    def test_session_is_cleared_after_patching(self):
+        patch_file = MZMProcedurePatch()
+
+        def run_steps(target: str):
+            patch_file.session.begin(self.rom)
+            raise ValueError("A step failed")
+
+        with patch.object(compression_cache, "default_directory", return_value=None), \
+                patch.object(APProcedurePatch, "patch", side_effect=run_steps, create=True):
+            with self.assertRaises(ValueError):
+                patch_file.patch("target.gba")
+        self.assertIsNone(patch_file.session.rom)
+        self.assertEqual(bytearray(), patch_file.session.rombuffer)
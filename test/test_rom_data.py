@@ -0,0 +1,499 @@
+import struct
+from types import SimpleNamespace
+from typing import Callable, List
+from unittest import TestCase, addModuleCleanup, skipIf
+from unittest.mock import patch
+
+from .. import compression_cache, lz10, patch_deltas, rle, rom_data
+from ..compression_cache import CompressionCache
+from ..data import get_rom_address
+from .reference import layout_patches as reference_layout_patches
+from ..rom_data import Area, CompiledLayoutPatches, BackgroundInfo, BackgroundProperties, BackgroundTilemap, Rectangle, RoomIndex, TileEdit
+
+
+def setUpModule():
+    # Keep what the tests compress out of the shared cache, whether or not its disk store is on
+    cache = patch.object(compression_cache, "cache", CompressionCache())
+    cache.start()
+    addModuleCleanup(cache.stop)
+
+
+def halfwords(tiles) -> bytes:
+    return b"".join(tile.to_bytes(2, "little") for tile in tiles)
+
+
+def rle_tilemap(width: int, height: int) -> bytes:
+    tiles = [(x * y) % 5 for y in range(height) for x in range(width)]
+    return bytes((width, height)) + rle.compress(halfwords(tiles))
+
+
+def lz77_tilemap() -> bytes:
+    tiles = [0x1000 * (i // 256) | i % 7 for i in range(32 * 32)]
+    return bytes(4) + lz10.compress(bytearray(halfwords(tiles)))
+
+
+def background_info(compressed_data: bytes, properties: BackgroundProperties, offset: int = 0x40) -> BackgroundInfo:
+    rom = bytes(offset) + compressed_data + b"\xAA" * 16
+    return BackgroundInfo(memoryview(rom), properties, 0x8000000 | offset)
+
+
+def without_numpy(function: Callable):
+    numpy = rom_data.numpy
+    try:
+        rom_data.numpy = None
+        return function()
+    finally:
+        rom_data.numpy = numpy
+
+
+class TestBackgroundTilemap(TestCase):
+    def tilemaps(self):
+        yield BackgroundTilemap(memoryview(rle_tilemap(7, 5)), BackgroundProperties.RLE_COMPRESSED)
+        yield BackgroundTilemap(memoryview(lz77_tilemap()), BackgroundProperties.LZ77_COMPRESSED)
+
+    def check_tiles(self):
+        for tilemap in self.tilemaps():
+            with self.subTest(compression=tilemap.compression):
+                expected = [[int.from_bytes(tilemap.decompressed[2 * (y * tilemap.width + x):][:2], "little")
+                             for x in range(tilemap.width)] for y in range(tilemap.height)]
+                tiles = tilemap.tiles
+                self.assertEqual(expected, [[tiles[y][x] for x in range(tilemap.width)] for y in range(tilemap.height)])
+                self.assertEqual(expected, tilemap.to_halfword_matrix())
+                with self.assertRaises((TypeError, ValueError)):
+                    tiles[0][0] = 1
+
+                # The view shares the decompressed buffer
+                tilemap.set(1, 2, 0x1234)
+                self.assertEqual(0x1234, tilemap.tiles[2][1])
+
+    def test_tiles(self):
+        self.check_tiles()
+
+    @skipIf(rom_data.numpy is None, "NumPy is not installed")
+    def test_tiles_without_numpy(self):
+        without_numpy(self.check_tiles)
+
+    def test_get_set(self):
+        for tilemap in self.tilemaps():
+            with self.subTest(compression=tilemap.compression):
+                original = tilemap.get(3, 4)
+                with self.assertRaises(ValueError):
+                    tilemap.set(3, 4, 0x55, original ^ 1)
+                self.assertEqual(original, tilemap.get(3, 4))
+                self.assertIsNone(tilemap.first_change)
+
+                tilemap.set(3, 4, 0x55, original)
+                tilemap.set(5, 0, 0x66)
+                self.assertEqual((0x55, 0x66), (tilemap.get(3, 4), tilemap.get(5, 0)))
+                self.assertEqual(10, tilemap.first_change)
+                decompressed = bytes(tilemap.decompressed)
+                self.assertEqual(0x55, int.from_bytes(decompressed[2 * (4 * tilemap.width + 3):][:2], "little"))
+
+    def test_from_info(self):
+        compressed_data = rle_tilemap(7, 5)
+        info = background_info(compressed_data, BackgroundProperties.RLE_COMPRESSED)
+        tilemap = BackgroundTilemap.from_info(info)
+        self.assertEqual((7, 5), (tilemap.width, tilemap.height))
+        self.assertEqual(len(compressed_data), tilemap.original_compressed_size)
+        # Without a limit, the tilemap can't grow past the space it already takes
+        self.assertEqual(len(compressed_data), tilemap.max_compressed_size)
+        self.assertEqual(compressed_data, bytes(tilemap.to_compressed_data()))
+        self.assertEqual(500, BackgroundTilemap.from_info(info, 500).max_compressed_size)
+
+        info = background_info(lz77_tilemap(), BackgroundProperties.LZ77_COMPRESSED)
+        tilemap = BackgroundTilemap.from_info(info)
+        self.assertEqual((32, 32), (tilemap.width, tilemap.height))
+        self.assertEqual(lz10.decompress(info.compressed_data()[4:]), tilemap.decompressed)
+
+    def test_lz77_limit_includes_padding(self):
+        """LZ77 data is padded to a multiple of 4 bytes, and the tilemap may grow into the padding."""
+        compressed_data = lz77_tilemap()
+        tilemap = BackgroundTilemap.from_info(background_info(compressed_data, BackgroundProperties.LZ77_COMPRESSED))
+        self.assertLess(tilemap.original_compressed_size, len(compressed_data))
+        self.assertEqual(len(compressed_data), tilemap.max_compressed_size)
+        self.assertEqual(compressed_data, bytes(tilemap.to_compressed_data(lz10.GREEDY)))
+
+    def test_compressed_size(self):
+        for tilemap in self.tilemaps():
+            tilemap.set(3, 4, 0x1234)
+            levels = [None] if tilemap.compression == BackgroundProperties.RLE_COMPRESSED else [lz10.GREEDY, lz10.OPTIMAL]
+            for level in levels:
+                with self.subTest(compression=tilemap.compression, level=level):
+                    self.assertEqual(len(tilemap.to_compressed_data(level)), tilemap.compressed_size(level))
+
+    def test_size_is_checked_before_encoding(self):
+        tilemap = BackgroundTilemap.from_info(background_info(lz77_tilemap(), BackgroundProperties.LZ77_COMPRESSED), 40)
+        tilemap.set(3, 4, 0x1234)
+        with patch.object(lz10, "encode_tokens", side_effect=AssertionError("Encoded data over the limit")):
+            for level in (lz10.GREEDY, lz10.OPTIMAL):
+                with self.subTest(level=level):
+                    with self.assertRaisesRegex(ValueError, "over limit"):
+                        tilemap.to_compressed_data(level)
+
+
+@skipIf(rom_data.numpy is None, "NumPy is not installed")
+class TestVectorizedEdits(TestCase):
+    """Ensure the NumPy and pure Python paths of the batch edits and transforms give the same results."""
+
+    def compare(self, edit: Callable[[BackgroundTilemap], None]):
+        def run():
+            tilemap = BackgroundTilemap(memoryview(rle_tilemap(7, 5)), BackgroundProperties.RLE_COMPRESSED)
+            try:
+                edit(tilemap)
+            except ValueError as error:
+                return str(error), bytes(tilemap.decompressed), tilemap.first_change
+            return None, bytes(tilemap.decompressed), tilemap.first_change
+
+        expected = run()
+        self.assertEqual(expected, without_numpy(run))
+        return expected
+
+    def test_apply_edits(self):
+        error, _, first_change = self.compare(lambda tilemap: tilemap.apply_edits(
+            [TileEdit(1, 1, 0x30, 1), TileEdit(6, 4, 0x31), TileEdit(0, 0, 0)]
+        ))
+        self.assertEqual((None, 2 * (7 + 1)), (error, first_change))
+
+    def test_apply_edits_errors(self):
+        error, decompressed, first_change = self.compare(lambda tilemap: tilemap.apply_edits([
+            TileEdit(1, 1, 0x30, 1),
+            TileEdit(7, 0, 0x30),
+            TileEdit(2, 2, 0x30, 0x40),
+            TileEdit(3, 3, 70000),
+            TileEdit(4, 4, -1, 1),
+        ]))
+        self.assertEqual("4 invalid edits: (7, 0) is out of bounds; "
+                         "unexpected tile at (2, 2) (expected 0040, found 0004); "
+                         "tile 11170 for (3, 3) doesn't fit in a halfword; "
+                         "tile -001 for (4, 4) doesn't fit in a halfword", error)
+        # Nothing is written when any edit is invalid
+        self.assertEqual((rle.decompress(rle_tilemap(7, 5)[2:]), None), (decompressed, first_change))
+
+    def test_transforms(self):
+        grid = [[(x + y) % 3 == 0 for x in range(7)] for y in range(5)]
+        transforms = [
+            lambda tilemap: tilemap.mask(0x0002),
+            lambda tilemap: tilemap.add_flags(0x8000, Rectangle(2, 1, 3, 2)),
+            lambda tilemap: tilemap.replace(4, 0x0400, grid),
+            lambda tilemap: tilemap.remap([0x10 * tile for tile in range(16)]),
+        ]
+        for i, transform in enumerate(transforms):
+            with self.subTest(i=i):
+                error, _, first_change = self.compare(transform)
+                self.assertIsNone(error)
+                self.assertIsNotNone(first_change)
+
+    def test_transform_values_out_of_range(self):
+        transforms = [
+            lambda tilemap: tilemap.mask(-1),
+            lambda tilemap: tilemap.add_flags(0x10000),
+            lambda tilemap: tilemap.replace(4, 70000),
+            lambda tilemap: tilemap.remap([0x10000 + tile for tile in range(16)]),
+        ]
+        for i, transform in enumerate(transforms):
+            with self.subTest(i=i):
+                error, _, first_change = self.compare(transform)
+                self.assertIsNotNone(error)
+                self.assertIsNone(first_change)
+
+    def test_invalid_regions(self):
+        original = rle.decompress(rle_tilemap(7, 5)[2:])
+        transforms = [
+            (lambda tilemap: tilemap.add_flags(0x8000, Rectangle(5, 0, 5, 1)),
+             "Rectangle(x=5, y=0, width=5, height=1) is outside the 7x5 tilemap"),
+            (lambda tilemap: tilemap.add_flags(0x8000, Rectangle(-1, 0, 2, 1)),
+             "Rectangle(x=-1, y=0, width=2, height=1) is outside the 7x5 tilemap"),
+            (lambda tilemap: tilemap.replace(4, 0x0400, [[True] * 7]),
+             "Region grid doesn't match the 7x5 tilemap"),
+            (lambda tilemap: tilemap.mask(0x0002, [[True] * 6] * 5),
+             "Region grid doesn't match the 7x5 tilemap"),
+            (lambda tilemap: tilemap.remap([0x10 * tile for tile in range(4)]),
+             "Table has 4 entries, but the region has tile 0004"),
+        ]
+        for i, (transform, message) in enumerate(transforms):
+            with self.subTest(i=i):
+                # Nothing is written when the region or table is invalid
+                self.assertEqual((message, original, None), self.compare(transform))
+        # The table only has to cover the tiles in the region
+        error, _, _ = self.compare(lambda tilemap: tilemap.remap([0x10 * tile for tile in range(4)], Rectangle(0, 0, 7, 1)))
+        self.assertIsNone(error)
+
+
+class TestUnchangedTilemaps(TestCase):
+    def test_lazy_decode(self):
+        tilemap = BackgroundTilemap.from_info(background_info(lz77_tilemap(), BackgroundProperties.LZ77_COMPRESSED))
+        self.assertIsNone(tilemap._decompressed)
+        self.assertEqual(0x1004, tilemap.get(0, 8))
+        self.assertIsNotNone(tilemap._decompressed)
+
+    def test_unchanged_tilemap_is_not_written(self):
+        for compressed_data, properties in ((rle_tilemap(7, 5), BackgroundProperties.RLE_COMPRESSED),
+                                            (lz77_tilemap(), BackgroundProperties.LZ77_COMPRESSED)):
+            with self.subTest(properties=properties):
+                info = background_info(compressed_data, properties)
+                tilemap = BackgroundTilemap.from_info(info)
+                # Writing the value that's already there doesn't count as a change
+                tilemap.set(3, 4, tilemap.get(3, 4))
+                tilemap.apply_edits([TileEdit(1, 2, tilemap.get(1, 2))])
+                self.assertFalse(tilemap.changed)
+                self.assertIsNone(tilemap.first_change)
+                self.assertEqual(tilemap.original_data, tilemap.to_compressed_data())
+
+                rombuffer = bytearray(b"\x55" * len(info.rom))
+                rom_data.write_tilemap(rombuffer, tilemap, info)
+                self.assertEqual(b"\x55" * len(info.rom), rombuffer)
+
+                tilemap.set(3, 4, tilemap.get(3, 4) ^ 1)
+                self.assertTrue(tilemap.changed)
+                rom_data.write_tilemap(rombuffer, tilemap, info)
+                written = rombuffer[info.rom_address():info.rom_address() + len(tilemap.to_compressed_data())]
+                self.assertEqual(tilemap.to_compressed_data(), written)
+
+
+class TestPatchSession(TestCase):
+    def setUp(self):
+        self.rom = bytes(0x40) + lz77_tilemap() + b"\xAA" * 16
+        self.rom = self.rom.ljust(0x800, b"\0") + rle_tilemap(7, 5) + b"\xAA" * 16
+        self.session = rom_data.PatchSession()
+        self.layers = ((0x40, BackgroundProperties.LZ77_COMPRESSED), (0x800, BackgroundProperties.RLE_COMPRESSED))
+
+    def info(self, offset: int, properties: BackgroundProperties) -> BackgroundInfo:
+        return BackgroundInfo(memoryview(self.session.rombuffer), properties, 0x8000000 | offset)
+
+    def test_buffer_reuse(self):
+        rombuffer = self.session.begin(self.rom)
+        rombuffer[0] = 1
+        patched = self.session.end()
+        self.assertIs(rombuffer, self.session.begin(patched))
+        self.session.end()
+        self.assertIs(rombuffer, self.session.begin(bytes(bytearray(patched))))
+        self.session.end()
+
+        # Starting from another ROM reads it again
+        rombuffer = self.session.begin(self.rom)
+        self.assertEqual(self.rom, rombuffer)
+        self.assertEqual(0, self.session.rombuffer[0])
+
+    def test_failed_step_is_read_again(self):
+        self.session.begin(self.rom)
+        patched = self.session.end()
+        # A step that raises never reaches end, and may have written part of its changes
+        self.session.begin(patched)[0] = 1
+        self.session.tilemap(self.info(*self.layers[0])).decompressed
+        self.assertEqual(patched, self.session.begin(patched))
+        self.assertEqual({}, self.session._tilemaps)
+
+    def test_clear(self):
+        self.session.begin(self.rom)
+        info = self.info(*self.layers[0])
+        tilemap = self.session.tilemap(info)
+        tilemap.decompressed
+        self.session.write_tilemap(tilemap, info)
+        self.session.end()
+        self.assertEqual(1, len(self.session._tilemaps))
+
+        self.session.clear()
+        self.assertEqual((None, bytearray(), {}), (self.session.rom, self.session.rombuffer, self.session._tilemaps))
+
+    def test_written_tilemaps_are_reused(self):
+        for offset, properties in self.layers:
+            with self.subTest(properties=properties):
+                self.session.begin(self.rom)
+                info = self.info(offset, properties)
+                tilemap = self.session.tilemap(info, 0x1000)
+                tilemap.set(1, 2, 0x1234)
+                self.session.write_tilemap(tilemap, info)
+                self.session.begin(self.session.end())
+
+                reused = self.session.tilemap(info, 0x1000)
+                read = BackgroundTilemap.from_info(info, 0x1000)
+                # The tiles and size come from the session, so nothing is decoded again
+                self.assertIsNotNone(reused._decompressed)
+                self.assertEqual(read.original_compressed_size, reused._original_compressed_size)
+                self.assertEqual(read.original_data, reused.original_data)
+                self.assertEqual(0x1234, reused.get(1, 2))
+
+    def test_read_tilemaps_are_reused(self):
+        for offset, properties in self.layers:
+            with self.subTest(properties=properties):
+                self.session.begin(self.rom)
+                info = self.info(offset, properties)
+                tilemap = self.session.tilemap(info)
+                decompressed = bytes(tilemap.decompressed)
+                self.session.write_tilemap(tilemap, info)
+                self.session.begin(self.session.end())
+
+                reused = self.session.tilemap(info)
+                self.assertIsNotNone(reused._decompressed)
+                self.assertEqual(tilemap.original_compressed_size, reused._original_compressed_size)
+                self.assertEqual(decompressed, reused.decompressed)
+
+    def test_outside_writes_invalidate_tilemaps(self):
+        for offset, properties in self.layers:
+            with self.subTest(properties=properties):
+                rombuffer = self.session.begin(self.rom)
+                info = self.info(offset, properties)
+                tilemap = self.session.tilemap(info, 0x1000)
+                original_data = bytes(tilemap.original_data)
+                original = tilemap.get(1, 2)
+                tilemap.set(1, 2, 0x1234)
+                self.session.write_tilemap(tilemap, info)
+
+                # Put the original tilemap back without telling the session
+                rom_data.write_data(rombuffer, original_data, offset)
+                reread = self.session.tilemap(info, 0x1000)
+                self.assertIsNone(reread._decompressed)
+                self.assertEqual(original, reread.get(1, 2))
+                self.session.end()
+
+
+def room_entry(room: int) -> bytes:
+    """A room entry whose pointers are made from the room number, so they're easy to check."""
+    properties = (BackgroundProperties.LZ77_COMPRESSED, BackgroundProperties.RLE_COMPRESSED, 0, 0)
+    pointers = [0x8000000 | room << 8 | layer for layer in range(5)]
+    return struct.pack("<BBBBBxxxIIIIIxxxxI", 1, *properties, *pointers, 0x8000000 | room << 8 | 0xFF).ljust(60, b"\0")
+
+
+def rom_with_rooms(room_counts: List[int]) -> bytes:
+    table = get_rom_address("sAreaRoomEntryPointers")
+    rom = bytearray(table + 4 * len(room_counts))
+    for area, room_count in enumerate(room_counts):
+        rom[table + 4 * area:table + 4 * area + 4] = (0x8000000 | len(rom)).to_bytes(4, "little")
+        rom += b"".join(room_entry(room) for room in range(room_count))
+        rom += b"\xFF" * 60
+    return bytes(rom)
+
+
+class TestRoomIndex(TestCase):
+    def setUp(self):
+        self.index = RoomIndex(rom_with_rooms([3, 0, 5]))
+
+    def test_room_count(self):
+        self.assertEqual([3, 0, 5], [self.index.room_count(area) for area in range(3)])
+
+    def test_rooms(self):
+        rooms = list(self.index.rooms(Area.NORFAIR))
+        self.assertEqual(list(range(5)), [room for room, _ in rooms])
+        for room, room_info in rooms:
+            self.assertEqual([room << 8 | layer for layer in range(5)],
+                             [room_info.bg0.rom_address(), room_info.bg1.rom_address(), room_info.bg2.rom_address(),
+                              room_info.clipdata.rom_address(), room_info.bg3.rom_address()])
+            self.assertEqual(room << 8 | 0xFF, room_info.default_sprite_data_address)
+        self.assertEqual([], list(self.index.rooms(Area.KRAID)))
+
+    def test_rooms_are_parsed_once(self):
+        self.assertIs(self.index(Area.BRINSTAR, 2), self.index(Area.BRINSTAR, 2))
+        self.assertIs(self.index(Area.NORFAIR, 4), dict(self.index.rooms(Area.NORFAIR))[4])
+
+
+class TestRoomInfo(TestCase):
+    def test_layers_are_built_on_first_use(self):
+        rom = bytearray(room_entry(7))
+        rom[4] = 0x7F  # Not a valid property, but bg3 is never used
+        room_info = rom_data.RoomInfo.from_pointer(bytes(rom), 0x8000000)
+        self.assertEqual([None] * 5, room_info._layers)
+
+        clipdata = room_info.clipdata
+        self.assertEqual(BackgroundProperties.RLE_COMPRESSED, clipdata.properties)
+        self.assertEqual(7 << 8 | 3, clipdata.rom_address())
+        self.assertEqual([None, None, None, None, clipdata], room_info._layers)
+        self.assertIs(clipdata, room_info.clipdata)
+
+        self.assertEqual(BackgroundProperties.LZ77_COMPRESSED, room_info.bg0.properties)
+        with self.assertRaises(ValueError):
+            room_info.bg3
+
+
+class TestLayoutPatches(TestCase):
+    def record_reference(self, patches) -> CompiledLayoutPatches:
+        """Run the original layout patches against stand-ins that record their limits, edits, and sprites."""
+        recorded = CompiledLayoutPatches({}, {})
+
+        class Layer:
+            def __init__(self, key):
+                self.key = key
+
+            def rom_address(self):
+                return None
+
+        class Room:
+            def __init__(self, area, room):
+                for layer in ("bg0", "bg1", "bg2", "bg3", "clipdata"):
+                    setattr(self, layer, Layer((area, room, layer)))
+                self.default_sprite_data_address = (area, room)
+
+        class Tilemap:
+            def __init__(self, key, max_compressed_size):
+                self.edits = recorded.tilemaps.setdefault(key, rom_data.TilemapPatch(max_compressed_size, [])).edits
+
+            @classmethod
+            def from_info(cls, info, max_compressed_size=None):
+                return cls(info.key, max_compressed_size)
+
+            def set(self, x, y, tile, original_tile=None):
+                self.edits.append(TileEdit(x, y, tile, original_tile))
+
+            def to_compressed_data(self):
+                return b""
+
+        def write_data(rombuffer, data, address):
+            if address is not None:
+                recorded.sprites[address] = [rom_data.SpriteData.unpack(data[i:i + 3]) for i in range(0, len(data) - 3, 3)]
+
+        with patch.multiple(reference_layout_patches, BackgroundTilemap=Tilemap, write_data=write_data,
+                            background_extraction_function=lambda rom: Room):
+            reference_layout_patches.apply_layout_patches(b"", patches)
+        return recorded
+
+    def test_matches_original_patches(self):
+        """Ensure the patch data makes the same edits, with the same size limits, as the original code."""
+        for patches in (set(), {"brinstar_top"}, rom_data.expansion_required_patches):
+            with self.subTest(patches=sorted(patches)):
+                # No two edits change the same tile, so their order doesn't matter
+                expected, actual = (
+                    ({key: (limit, sorted(edits)) for key, (limit, edits) in compiled.tilemaps.items()}, compiled.sprites)
+                    for compiled in (self.record_reference(patches), rom_data.compile_layout_patches(patches))
+                )
+                self.assertEqual(expected, actual)
+
+    def test_duplicate_edits(self):
+        duplicate = {"name": "duplicate", "tilemaps": [{
+            "area": "BRINSTAR", "room": 4, "layer": "clipdata", "edits": [[29, 8, "AIR", "BEAM_BLOCK_NEVER_REFORM"]]
+        }]}
+        with patch.object(rom_data, "layout_patches", [*rom_data.layout_patches, duplicate]):
+            with self.assertRaisesRegex(ValueError, r"\(29, 8\) of Brinstar 4 clipdata is edited more than once"):
+                rom_data.compile_layout_patches(set())
+
+    def test_conflicting_limits(self):
+        conflicting = {"name": "conflicting", "tilemaps": [{
+            "area": "BRINSTAR", "room": 4, "layer": "clipdata", "max_compressed_size": 200, "edits": []
+        }]}
+        with patch.object(rom_data, "layout_patches", [*rom_data.layout_patches, conflicting]):
+            with self.assertRaisesRegex(ValueError, r"Brinstar 4 clipdata have different size limits \(142 and 200\)"):
+                rom_data.compile_layout_patches(set())
+
+
+class TestSizeLimits(TestCase):
+    def test_check_size_limits(self):
+        compressed_data = rle_tilemap(7, 5)
+        rooms = SimpleNamespace(clipdata=background_info(compressed_data, BackgroundProperties.RLE_COMPRESSED))
+        for limit, redundant in ((len(compressed_data), [(Area.BRINSTAR, 1, "clipdata")]), (len(compressed_data) + 8, [])):
+            with self.subTest(limit=limit):
+                with patch.multiple(rom_data, RoomIndex=lambda rom: lambda area, room: rooms, layout_patches=[],
+                                    background_patch_limits={(Area.BRINSTAR, 1, "clipdata"): limit}):
+                    self.assertEqual(redundant, rom_data.check_size_limits(b""))
+
+        with patch.multiple(rom_data, RoomIndex=lambda rom: lambda area, room: rooms, layout_patches=[],
+                            background_patch_limits={(Area.BRINSTAR, 1, "clipdata"): len(compressed_data) - 1}):
+            with self.assertRaisesRegex(ValueError, rf"Brinstar 1 clipdata \(limit: {len(compressed_data) - 1}, "
+                                                    rf"size: {len(compressed_data)}\)"):
+                rom_data.check_size_limits(b"")
+
+    def test_limits_fit_the_base_rom(self):
+        """Ensure no size limit is below the space its tilemap takes, or the same as the default one."""
+        try:
+            from ..rom import get_base_rom_path
+            rom = patch_deltas.read_base_patched_rom(str(get_base_rom_path()))
+        except (ImportError, KeyError, OSError, ValueError):
+            self.skipTest("The Metroid: Zero Mission ROM isn't available")
+        self.assertEqual([], rom_data.check_size_limits(rom))